@@ -1,12 +1,18 @@
 # backend/app/api/auth.py
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session, load_only
 from datetime import timedelta, datetime, timezone
 from google_auth_oauthlib.flow import Flow
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
+import requests
+from requests.adapters import HTTPAdapter
+import logging
+import threading
+import time
 import uuid
 import os
 
@@ -15,6 +21,7 @@ from app.core.security import (
     create_access_token,
     verify_password,
     get_password_hash,
+    password_needs_rehash,
     # create_password_reset_token # Not needed for simplified flow
 )
 # Import database session getter
@@ -22,10 +29,13 @@ from app.database import get_db
 # Import database models (User) and Pantic schemas
 from app import models, schemas
 # Import application settings
-from app.core.config import settings
+from app.core.config import settings, GOOGLE_OAUTH_SCOPES
+
+logger = logging.getLogger(__name__)
 
 # --- Router Setup ---
-router = APIRouter()
+# orjson serializes the token/user payloads faster than the stdlib json encoder
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # --- Google OAuth Configuration ---
 # WARNING: Allows HTTP for local dev. Remove in production (HTTPS required).
@@ -43,26 +53,104 @@ CLIENT_SECRETS_DICT = {
     }
 }
 
-# Scopes requested from Google during OAuth
-SCOPES = [
-    'openid',
-    'https://www.googleapis.com/auth/userinfo.email',
-    'https://www.googleapis.com/auth/userinfo.profile',
-    # --- ENSURE ONLY READONLY IS HERE ---
-    'https://www.googleapis.com/auth/drive.readonly' 
-    # --- REMOVE drive.file ---
-]
+# Scopes requested from Google during OAuth (shared with the Drive service)
+SCOPES = GOOGLE_OAUTH_SCOPES
+
+# Flow arguments are fixed, so build them once instead of per request
+_FLOW_KWARGS = dict(
+    client_config=CLIENT_SECRETS_DICT,
+    scopes=SCOPES,
+    redirect_uri=settings.GOOGLE_REDIRECT_URI
+)
+# Process-wide keep-alive pool for the token exchange with Google
+_OAUTH_HTTP_ADAPTER = HTTPAdapter(pool_connections=10, pool_maxsize=50)
+
+def _new_flow() -> Flow:
+    """
+    Creates an OAuth Flow for one login attempt. Flow holds per-login state, so it
+    is not shared, but its session reuses the pooled connections to Google.
+    """
+    flow = Flow.from_client_config(**_FLOW_KWARGS)
+    flow.oauth2session.mount("https://", _OAUTH_HTTP_ADAPTER)
+    return flow
+
+
+# Google's ID-token signing certs (the URL verify_oauth2_token fetches)
+_GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+_GOOGLE_CERTS_DEFAULT_TTL = 3600 # seconds, used if the response has no max-age
+
+class _CertCachingRequest(google_requests.Request):
+    """
+    google-auth transport on a keep-alive session that caches the signing-cert response
+    for its Cache-Control max-age, so ID-token verification does not re-fetch the
+    certs from Google on every login.
+    """
+
+    def __init__(self):
+        session = requests.Session()
+        session.mount("https://", _OAUTH_HTTP_ADAPTER)
+        super().__init__(session=session)
+        self._certs_response = None
+        self._certs_expire_at = 0.0
+        self._certs_refreshing = False
+        self._certs_lock = threading.Lock() # Guards the fields above only, never held over network I/O
+
+    def __call__(self, url, method="GET", body=None, headers=None,
+                 timeout=google_requests._DEFAULT_TIMEOUT, **kwargs):
+        # Same default timeout as google-auth: verify_oauth2_token passes none of its own
+        if method != "GET" or url != _GOOGLE_CERTS_URL:
+            return super().__call__(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+        with self._certs_lock:
+            cached = self._certs_response
+            if cached is not None and (self._certs_refreshing or time.monotonic() < self._certs_expire_at):
+                # Fresh, or another thread is refreshing: keep serving the previous certs
+                return cached
+            self._certs_refreshing = True
+        try:
+            response = super().__call__(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+        finally:
+            with self._certs_lock:
+                self._certs_refreshing = False
+        if response.status == 200:
+            with self._certs_lock:
+                self._certs_response = response
+                self._certs_expire_at = time.monotonic() + _max_age(response.headers)
+        return response
+
+def _max_age(headers) -> int:
+    """Extracts max-age (seconds) from a Cache-Control header."""
+    for directive in headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name == "max-age" and value.isdigit():
+            return int(value)
+    return _GOOGLE_CERTS_DEFAULT_TTL
+
+_GOOGLE_REQUEST = _CertCachingRequest()
+
+def _email_is(email: str):
+    """
+    Case-insensitive email match, served by the ix_users_email_lower expression index.
+    Also matches accounts stored with mixed case before emails were normalized.
+    """
+    return func.lower(models.User.email) == email.lower()
 
 # --- Standard Authentication Endpoints ---
+# These handlers only do blocking work (sync SQLAlchemy, password hashing), so they are plain
+# `def` functions: FastAPI runs them in its threadpool instead of on the event loop.
 
-@router.post("/register", response_model=schemas.User)
-async def register(
+# Response documented via `responses` rather than `response_model`: the payload is built
+# here from the ORM row, so FastAPI skips re-validating and re-encoding it.
+@router.post("/register", responses={200: {"model": schemas.User}})
+def register(
     form_data: schemas.UserCreate,
     db: Session = Depends(get_db)
 ):
     """Handles new user registration."""
-    db_user = db.query(models.User).filter(models.User.email == form_data.email).first()
-    if db_user:
+    # Existence check only; no need to hydrate a full User row
+    email_taken = db.execute(
+        select(exists().where(_email_is(form_data.email)))
+    ).scalar()
+    if email_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
@@ -75,18 +163,26 @@ async def register(
         is_active=True
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return new_user
+    db.commit() # Flush assigns new_user.id; attributes stay loaded (expire_on_commit=False)
+    return ORJSONResponse({
+        "id": new_user.id,
+        "email": new_user.email,
+        "full_name": new_user.full_name,
+        "is_active": new_user.is_active
+    })
 
 @router.post("/login", response_model=schemas.Token)
-async def login(
+def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """Handles standard email/password login and returns a JWT."""
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Only the columns login reads (skips the Google token columns)
+    user = db.query(models.User).options(
+        load_only(models.User.email, models.User.hashed_password, models.User.is_active)
+    ).filter(_email_is(form_data.username)).first()
+    # Unknown emails still pay for a hash check, so response time does not reveal them
+    if not verify_password(form_data.password, user.hashed_password if user else None):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -94,6 +190,10 @@ async def login(
         )
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    if password_needs_rehash(user.hashed_password):
+        # Upgrade bcrypt (or outdated argon2) hashes while the plain password is at hand
+        user.hashed_password = get_password_hash(form_data.password)
+        db.commit()
 
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -106,11 +206,7 @@ async def login(
 @router.get("/google/login")
 async def google_login(request: Request):
     """Redirects the user to Google's authentication page."""
-    flow = Flow.from_client_config(
-        client_config=CLIENT_SECRETS_DICT,
-        scopes=SCOPES,
-        redirect_uri=settings.GOOGLE_REDIRECT_URI
-    )
+    flow = _new_flow()
     authorization_url, state = flow.authorization_url(
         access_type='offline', # Request offline access to get refresh_token
         include_granted_scopes='true',
@@ -121,8 +217,11 @@ async def google_login(request: Request):
     return RedirectResponse(authorization_url)
 
 @router.get("/google/callback")
-async def google_callback(request: Request, db: Session = Depends(get_db)):
-    """Handles the redirect from Google after user consent."""
+def google_callback(request: Request, db: Session = Depends(get_db)):
+    """
+    Handles the redirect from Google after user consent.
+    A plain `def` so the token exchange, password hashing and DB work run in the threadpool.
+    """
     # Production CSRF check:
     # state = request.query_params.get('state')
     # if not state or state != request.session.get('state'):
@@ -133,11 +232,7 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Missing authorization code")
 
     # Re-initialize the Flow object with scopes for token fetching
-    flow = Flow.from_client_config(
-        client_config=CLIENT_SECRETS_DICT,
-        scopes=SCOPES, # This was the missing argument
-        redirect_uri=settings.GOOGLE_REDIRECT_URI
-    )
+    flow = _new_flow()
 
     try:
         # Exchange the authorization code for credentials
@@ -147,26 +242,26 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
         # Verify the ID token to get user information securely
         id_info = id_token.verify_oauth2_token(
             credentials.id_token,
-            google_requests.Request(),
+            _GOOGLE_REQUEST, # Shared transport with cached signing certs
             settings.GOOGLE_CLIENT_ID
         )
 
         user_email = id_info.get('email')
+        if user_email:
+            user_email = user_email.lower() # Stored lower-cased, like registered emails
         user_name = id_info.get('name', 'Google User') # Use 'name' from profile scope
 
         if not user_email:
             raise HTTPException(status_code=400, detail="Could not retrieve email from Google")
 
-        # --- ADD DETAILED LOGGING ---
-        print("-" * 20)
-        print("Google Callback Processing:")
-        print(f"Received ID Token for: {user_email}")
-        print(f"Credentials object obtained: {credentials}") # Log the whole object (might be verbose)
-        print(f"Does credentials have refresh token? {'Yes' if credentials.refresh_token else 'No'}")
-        # --- END LOGGING ---
+        logger.debug("Google callback: received ID token for %s", user_email)
+        if logger.isEnabledFor(logging.DEBUG):
+            # Only build the (large) credentials repr when debug logging is on
+            logger.debug("Credentials object obtained: %r", credentials)
+            logger.debug("Credentials include refresh token: %s", bool(credentials.refresh_token))
 
         # Find existing user or create a new one
-        user = db.query(models.User).filter(models.User.email == user_email).first()
+        user = db.query(models.User).filter(_email_is(user_email)).first()
         token_updated = False # Flag to track if DB commit is needed for tokens
 
         if not user:
@@ -182,23 +277,19 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
             # Save refresh token (usually only provided on first auth)
             if credentials.refresh_token:
                 user.google_refresh_token = credentials.refresh_token
-                # --- ADD LOGGING ---
-                print(f"!!! SAVING NEW refresh token for NEW user {user_email}: {credentials.refresh_token[:10]}...") # Log first 10 chars
-                # --- END LOGGING ---
+                logger.debug("Saving refresh token for new user %s", user_email)
             if credentials.expiry: # Store expiry of the access token (optional)
                 user.google_token_expiry = credentials.expiry.replace(tzinfo=timezone.utc)
             db.add(user)
             token_updated = True
-            print(f"Created new user via Google OAuth: {user_email}")
+            logger.info("Created new user via Google OAuth: %s", user_email)
         else:
-             print(f"User logged in via Google OAuth: {user_email}")
+             logger.info("User logged in via Google OAuth: %s", user_email)
              if not user.is_active:
                  raise HTTPException(status_code=400, detail="User account is inactive")
              # Update refresh token if a new one is provided and different
              if credentials.refresh_token and user.google_refresh_token != credentials.refresh_token:
-                 # --- ADD LOGGING ---
-                 print(f"!!! UPDATING refresh token for EXISTING user {user_email}: {credentials.refresh_token[:10]}...") # Log first 10 chars
-                 # --- END LOGGING ---
+                 logger.debug("Updating refresh token for existing user %s", user_email)
                  user.google_refresh_token = credentials.refresh_token; token_updated = True
              # Update expiry if provided and different (optional)
              if credentials.expiry and user.google_token_expiry != credentials.expiry.replace(tzinfo=timezone.utc):
@@ -207,22 +298,13 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
         # Commit changes if tokens were added/updated
         if token_updated:
             try:
-                print("Attempting to commit token changes to DB...")
+                # Single commit; expire_on_commit=False keeps `user` loaded (incl. new ID), no refresh needed
                 db.commit()
-                db.refresh(user) # Refresh to get latest state including ID if new user
-                print("DB commit successful.")
-            except Exception as db_err:
-                print(f"!!! DB Commit FAILED: {db_err}")
+            except Exception:
+                logger.exception("Failed to commit Google token changes for %s", user_email)
                 db.rollback()
                 raise HTTPException(status_code=500, detail="Failed to save credentials.")
 
-        # --- ADD LOGGING ---
-        # Check token directly from the user object *after* potential commit
-        db.refresh(user) # Ensure we have latest data from DB
-        print(f"User object in DB google_refresh_token: {user.google_refresh_token[:10] if user.google_refresh_token else 'None'}")
-        print("-" * 20)
-        # --- END LOGGING ---
-
         # Generate the application's JWT for the authenticated user
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         app_access_token = create_access_token(
@@ -234,36 +316,40 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
         response = RedirectResponse(frontend_redirect_url)
         return response
 
-    except Exception as e:
-        print(f"Error during Google OAuth callback: {e}")
+    except Exception:
+        logger.exception("Error during Google OAuth callback")
         # Consider more specific error handling (e.g., token fetch failure)
         raise HTTPException(status_code=500, detail=f"Authentication failed during Google callback.")
 
 # --- Simplified Password Reset Endpoints (DEMO ONLY - INSECURE) ---
 
 @router.post("/forgot-password", response_model=schemas.ForgotPasswordResponse)
-async def forgot_password_simple(
+def forgot_password_simple(
     request: schemas.ForgotPasswordRequest,
     db: Session = Depends(get_db)
 ):
     """Checks if user exists (DEMO VERSION). Does not send email."""
-    user = db.query(models.User).filter(models.User.email == request.email).first()
-    if not user:
-        print(f"Password reset requested for non-existent email: {request.email}")
+    # Existence check only: fetch the id, not the row
+    user_id = db.scalar(select(models.User.id).where(_email_is(request.email)))
+    if user_id is None:
+        logger.info("Password reset requested for non-existent email: %s", request.email)
 
     # No token generation needed for this simple flow
-    print(f"Password reset requested for: {request.email}")
+    logger.info("Password reset requested for: %s", request.email)
     return {
         "message": "Password reset request processed. Proceed to reset password."
     }
 
 @router.post("/reset-password", response_model=schemas.SimpleResponse)
-async def reset_password_simple(
+def reset_password_simple(
     request: schemas.ResetPasswordRequest, # Uses schema with email, new_password
     db: Session = Depends(get_db)
 ):
     """Resets password directly based on email (DEMO VERSION - INSECURE)."""
-    user = db.query(models.User).filter(models.User.email == request.email).first()
+    # Columns read below; the reset-token columns are only assigned, so they need not be loaded
+    user = db.query(models.User).options(
+        load_only(models.User.email, models.User.hashed_password, models.User.is_active)
+    ).filter(_email_is(request.email)).first()
 
     if not user:
          raise HTTPException(
@@ -287,5 +373,5 @@ async def reset_password_simple(
     user.reset_token_expires = None
     db.commit()
 
-    print(f"Password reset successfully for: {user.email}")
+    logger.info("Password reset successfully for: %s", user.email)
     return {"message": "Password has been reset successfully."}
\ No newline at end of file
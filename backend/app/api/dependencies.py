@@ -1,15 +1,33 @@
+import threading
+
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 
 from app.core.security import decode_access_token
 from app.database import get_db
 from app import models, schemas
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-        
+
+# Raw token -> (user_id, is_active) for recently validated tokens.
+# A hit skips JWT verification and the email lookup; the short TTL bounds how long
+# a deactivated user keeps access.
+_USER_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+_USER_CACHE_LOCK = threading.Lock() # TTLCache is not thread-safe; sync deps run in the threadpool
+
+# Columns routes commonly read; the password hash and Google tokens load on access if needed
+_CURRENT_USER_COLUMNS = load_only(
+    models.User.id,
+    models.User.email,
+    models.User.full_name,
+    models.User.is_active,
+    models.User.drive_folder_id
+)
+
 def get_current_user(
-    token: str = Depends(oauth2_scheme), 
+    token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> models.User:
     credentials_exception = HTTPException(
@@ -17,18 +35,37 @@ def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+    with _USER_CACHE_LOCK:
+        cached = _USER_CACHE.get(token)
+
+    if cached is not None:
+        user_id, is_active = cached
+        if not is_active:
+            raise HTTPException(status_code=400, detail="Inactive user")
+        # Primary-key lookup; routes still get a session-bound User they can modify
+        user = db.get(models.User, user_id, options=[_CURRENT_USER_COLUMNS])
+        if user is None:
+            with _USER_CACHE_LOCK:
+                _USER_CACHE.pop(token, None)
+            raise credentials_exception
+        return user
+
     token_data = decode_access_token(token)
     if token_data is None or token_data.email is None:
         raise credentials_exception
-        
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
-    
+
+    user = db.query(models.User).options(_CURRENT_USER_COLUMNS).filter(
+        models.User.email == token_data.email
+    ).first()
+
     if user is None:
         raise credentials_exception
-    
-    
+
+    with _USER_CACHE_LOCK:
+        _USER_CACHE[token] = (user.id, user.is_active)
+
     if not user.is_active:
          raise HTTPException(status_code=400, detail="Inactive user")
 
-    return user
\ No newline at end of file
+    return user
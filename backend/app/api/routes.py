@@ -4,19 +4,27 @@ from fastapi import (
     APIRouter, UploadFile, File, HTTPException, # <-- Ensure HTTPException is imported here
     Depends, status, Path, BackgroundTasks
 )
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
+import asyncio
+import logging
 import tempfile
 import os
 import uuid # Used for placeholder response in upload
 
 # Import core RAG logic
 from app.core import rag
+from app.core import semantic_cache
+from app.core import documents
+from app.core import parsing
+from app.core import legacy_vectors
+from app.core.embeddings import embedding_function_instance
 # Import config settings
 from app.core.config import settings
-# Import vector DB utilities
-from app.vector_db import get_chroma_collection_object
 # Import Google Drive service functions
-from app.core.drive_service import sync_drive_folder # Import sync function
+from app.core.drive_service import start_sync_job, run_sync_job, get_sync_job_status # Background sync jobs
 
 # Import Pydantic schemas and SQLAlchemy models
 from app import schemas, models
@@ -29,21 +37,46 @@ from app.database import get_db
 from app.api.dependencies import get_current_user
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Block size used when spooling uploads to disk
+UPLOAD_CHUNK_SIZE = 1 << 20 # 1 MiB
+
+# Upload types the loaders in core/parsing.py handle: extension -> accepted declared MIME types
+ALLOWED_UPLOAD_TYPES = {
+    ".pdf": {"application/pdf"},
+    ".docx": {"application/vnd.openxmlformats-officedocument.wordprocessingml.document"},
+    ".csv": {"text/csv", "application/vnd.ms-excel"}, # Some browsers label CSV as Excel
+}
+
+def _content_matches_type(ext: str, head: bytes) -> bool:
+    """Cheap magic-byte check of the first bytes against the claimed file type."""
+    if ext == ".pdf":
+        return head.startswith(b"%PDF-")
+    if ext == ".docx":
+        return head.startswith(b"PK\x03\x04") # DOCX is a ZIP container
+    # CSV: plain text, so no NUL bytes
+    return b"\x00" not in head
+
 # --- Document Management Endpoints ---
 
+# Routes whose only blocking work is the sync DB session are plain `def`: FastAPI runs
+# them in the threadpool, so Postgres round-trips never block the event loop.
+
 @router.get("/documents", response_model=list[str])
-async def list_documents(
+def list_documents(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Fetches a list of original filenames the user has uploaded."""
-    documents = db.query(models.Document.original_filename).filter(
-        models.Document.owner_id == current_user.id
-    ).order_by(models.Document.uploaded_at.desc()).all()
-    # Extract filename string from the tuple result
-    return [doc[0] for doc in documents]
+    # scalars() yields the bare filename strings, no per-row tuples to unpack
+    return db.scalars(
+        select(models.Document.original_filename)
+        .where(models.Document.owner_id == current_user.id)
+        .order_by(models.Document.uploaded_at.desc())
+    ).all()
 
 @router.post("/upload", response_model=schemas.UploadResponse)
 async def upload_document(
@@ -55,53 +88,85 @@ async def upload_document(
     Handles file upload, processing, adding vectors to ChromaDB,
     and recording the upload in PostgreSQL.
     """
+    # Reject unsupported or oversized files before touching disk or the RAG pipeline
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    if suffix not in ALLOWED_UPLOAD_TYPES or file.content_type not in ALLOWED_UPLOAD_TYPES[suffix]:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Unsupported file type. Please upload PDF, DOCX, or CSV."
+        )
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the {settings.MAX_UPLOAD_BYTES // (1024 * 1024)} MiB upload limit."
+    )
+    if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+        raise too_large
+
     tmp_path = ""
     try:
         # Save uploaded file temporarily to disk
-        suffix = os.path.splitext(file.filename)[1]
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            content = await file.read()
-            tmp.write(content)
             tmp_path = tmp.name
-
-        # Load and chunk the document using core RAG logic
-        pages = rag.load_document(tmp_path)
-        chunks = rag.chunk_document(pages)
+            # Copy in 1 MiB blocks so memory stays bounded regardless of file size;
+            # stop as soon as the running total passes the cap (the file is removed below)
+            total_bytes = 0
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                if total_bytes == 0 and not _content_matches_type(suffix, chunk[:512]):
+                    raise HTTPException(
+                        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                        detail=f"File content does not match its {suffix} extension."
+                    )
+                total_bytes += len(chunk)
+                if total_bytes > settings.MAX_UPLOAD_BYTES:
+                    raise too_large
+                tmp.write(chunk)
+
+        # Load and chunk the document using core RAG logic.
+        # Loading and splitting is largely Python (GIL-bound), so it runs in the parse process pool;
+        # embedding and Chroma writes are blocking but release the GIL, so they use the
+        # threadpool. Either way the event loop stays free (DB work stays on this task).
+        chunks = await asyncio.get_running_loop().run_in_executor(
+            parsing.get_parse_pool(), parsing.load_and_chunk, tmp_path
+        )
         if not chunks:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Document is empty or could not be processed.")
 
-        # Add document chunks to ChromaDB vector store with user metadata
-        rag.add_documents_to_chroma(
+        # Add document chunks to ChromaDB vector store collection for this user
+        chunk_ids = await run_in_threadpool(
+            rag.add_documents_to_chroma,
             chunks=chunks,
             user_id=current_user.id,
             source_filename=file.filename
         )
-
-        # Record the uploaded document filename in PostgreSQL if not already present
-        existing_doc = db.query(models.Document).filter(
-            models.Document.owner_id == current_user.id,
-            models.Document.original_filename == file.filename
-        ).first()
-
-        if not existing_doc:
-            new_document_record = models.Document(
-                original_filename=file.filename,
-                owner_id=current_user.id
+        # Cached answers may no longer reflect the user's knowledge base
+        semantic_cache.invalidate_user(current_user.id)
+        rag.invalidate_qa_chain(current_user.id)
+
+        # Record the upload and its chunk IDs in PostgreSQL (sync session, so off the event loop;
+        # awaited, so the session is never used from two threads at once)
+        def record_upload():
+            stale = documents.record_document(
+                db, current_user.id, file.filename, chunk_ids, embedding_model=rag.EMBEDDING_MODEL_KEY
             )
-            db.add(new_document_record)
             db.commit()
-        else:
-             # Optionally update an 'updated_at' timestamp if the doc exists
-             pass # Placeholder for potential update logic
+            return stale
+        stale_ids = await run_in_threadpool(record_upload)
+        # A shorter re-upload leaves trailing chunks from the previous version behind
+        await run_in_threadpool(rag.delete_chunks_from_chroma, current_user.id, stale_ids)
 
         # Return success response (using filename as placeholder ID)
         return {
             "document_id": f"processed_{file.filename}",
             "message": f"File '{file.filename}' processed and added to knowledge base."
         }
+    except HTTPException:
+        # Deliberate client errors (type, size, empty document) keep their status code.
+        # Rollback is blocking DB I/O like the commit, so it also runs off the event loop
+        await run_in_threadpool(db.rollback)
+        raise
     except Exception as e:
-        db.rollback() # Ensure DB transaction is rolled back on error
-        print(f"Error during upload: {e}")
+        await run_in_threadpool(db.rollback) # Ensure DB transaction is rolled back on error
+        logger.exception("Error during upload of %s for user %s", file.filename, current_user.id)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to process file: {str(e)}")
     finally:
         # Clean up temporary file
@@ -110,7 +175,7 @@ async def upload_document(
 
 
 @router.delete("/documents/{filename}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_document(
+def delete_document(
     filename: str = Path(..., min_length=1, description="The URL-encoded name of the file to delete"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -118,13 +183,19 @@ async def delete_document(
     """
     Deletes a document record from PostgreSQL and associated vectors from ChromaDB.
     """
-    # Find the document metadata in PostgreSQL
-    document_record = db.query(models.Document).filter(
-        models.Document.owner_id == current_user.id,
-        models.Document.original_filename == filename
-    ).first()
+    # Chunk IDs recorded at ingest; document_chunks rows go with the document (ON DELETE CASCADE)
+    chunk_ids = documents.get_chunk_ids(db, current_user.id, filename)
 
-    if not document_record:
+    # Delete the PostgreSQL row in one statement; rowcount tells us whether it existed.
+    # The transaction is only committed once the vectors have been handled below.
+    result = db.execute(
+        delete(models.Document).where(
+            models.Document.owner_id == current_user.id,
+            models.Document.original_filename == filename
+        )
+    )
+    if result.rowcount == 0:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Document '{filename}' not found for this user."
@@ -132,27 +203,29 @@ async def delete_document(
 
     # Attempt to delete vectors from ChromaDB
     try:
-        chroma_collection = get_chroma_collection_object()
-        print(f"Attempting to delete vectors from ChromaDB for user {current_user.id} and filename '{filename}'...")
-        chroma_collection.delete(
-            where={
-                "user_id": str(current_user.id),
-                "source_filename": filename
-            }
-        )
-        print("Vectors deleted from ChromaDB successfully (if any existed).")
+        logger.debug("Deleting vectors from ChromaDB for user %s, filename '%s'", current_user.id, filename)
+        if chunk_ids:
+            # Delete by ID: cost is independent of collection size
+            rag.delete_chunks_from_chroma(current_user.id, chunk_ids)
+        else:
+            # Documents ingested before chunk IDs were tracked live in the shared legacy
+            # collection (until migrated at startup), tagged with their user_id
+            legacy_vectors.delete_legacy_chunks(current_user.id, filename)
+        logger.debug("Vectors deleted from ChromaDB (if any existed).")
     except Exception as e:
-        # Log error but continue to attempt deletion from PostgreSQL
-        print(f"Warning: Could not delete vectors from ChromaDB for {filename}: {e}")
+        # Log error but continue to remove the record from PostgreSQL
+        logger.warning("Could not delete vectors from ChromaDB for %s: %s", filename, e)
+
+    semantic_cache.invalidate_user(current_user.id)
+    rag.invalidate_qa_chain(current_user.id)
 
-    # Delete the record from PostgreSQL
+    # Commit the record deletion
     try:
-        db.delete(document_record)
         db.commit()
-        print(f"Document record '{filename}' deleted from PostgreSQL.")
-    except Exception as e:
+        logger.info("Document record '%s' deleted for user %s.", filename, current_user.id)
+    except Exception:
         db.rollback() # Rollback DB transaction on error
-        print(f"Error deleting document record '{filename}' from PostgreSQL: {e}")
+        logger.exception("Error deleting document record '%s' from PostgreSQL", filename)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete document record from database."
@@ -171,25 +244,86 @@ async def query_documents_for_user(
 ):
     """
     Answers a query based on all documents previously uploaded by the user,
-    using ChromaDB with metadata filtering by user ID.
+    using the user's own ChromaDB collection.
     """
     try:
-        # Create the RAG chain, filtered for the current user
-        qa_chain = rag.create_qa_chain(user_id=current_user.id)
-
-        # Invoke the chain to get the answer
-        answer_string = qa_chain.invoke(request.query)
-
+        # Repeated questions: exact-match tier, no embedding needed
+        cached_answer = semantic_cache.get_exact_answer(current_user.id, request.query)
+        if cached_answer is not None:
+            return {"answer": cached_answer}
+
+        # Serve near-duplicate questions from the semantic cache
+        # (embedding is blocking, so it runs in the threadpool)
+        query_vector = await run_in_threadpool(embedding_function_instance.embed_query, request.query)
+        cached_answer = semantic_cache.get_cached_answer(current_user.id, query_vector)
+        if cached_answer is not None:
+            return {"answer": cached_answer}
+
+        # Reuse the user's RAG chain (built once, filtered for the current user)
+        qa_chain = rag.get_qa_chain(user_id=current_user.id)
+
+        # Invoke the chain asynchronously: the Gemini call awaits its async client on the
+        # event loop, and only the blocking retrieval step is handed to a thread
+        answer_string = await qa_chain.ainvoke(request.query)
+
+        semantic_cache.store_answer(current_user.id, request.query, query_vector, answer_string)
         return {"answer": answer_string}
 
     except Exception as e:
-        print(f"Error during query for user {current_user.id}: {e}")
+        logger.exception("Error during query for user %s", current_user.id)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to get answer: {str(e)}")
 
+def _sse_event(data: str, event: str = None) -> str:
+    """Formats one Server-Sent Events frame; multi-line data becomes several `data:` lines."""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+@router.post("/query/stream")
+async def stream_query_documents_for_user(
+    request: schemas.UserQueryRequest,
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Same as /query, but streams the answer as Server-Sent Events while the LLM generates it.
+    Each `data:` frame carries a piece of the answer; a final `done` event ends the stream.
+    Cache hits are sent as a single frame.
+    """
+    user_id = current_user.id
+
+    async def event_generator():
+        try:
+            cached_answer = semantic_cache.get_exact_answer(user_id, request.query)
+            if cached_answer is None:
+                query_vector = await run_in_threadpool(embedding_function_instance.embed_query, request.query)
+                cached_answer = semantic_cache.get_cached_answer(user_id, query_vector)
+
+            if cached_answer is not None:
+                yield _sse_event(cached_answer)
+            else:
+                qa_chain = rag.get_qa_chain(user_id=user_id)
+                parts = []
+                async for token in qa_chain.astream(request.query):
+                    parts.append(token)
+                    yield _sse_event(token)
+                semantic_cache.store_answer(user_id, request.query, query_vector, "".join(parts))
+
+            yield _sse_event("", event="done")
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.exception("Error during streaming query for user %s", user_id)
+            yield _sse_event(f"Failed to get answer: {str(e)}", event="error")
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # Keep proxies from buffering the stream
+    )
+
 # --- Google Drive Integration Endpoints ---
 
 @router.post("/drive/folder", status_code=status.HTTP_200_OK, response_model=schemas.SimpleResponse)
-async def set_drive_folder(
+def set_drive_folder(
     request: SetFolderRequest, # Use the schema imported from app.schemas
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -202,19 +336,22 @@ async def set_drive_folder(
     current_user.drive_folder_id = request.folder_id
     db.commit()
 
-    print(f"Set Drive Folder ID for user {current_user.email} to {request.folder_id}")
+    logger.info("Set Drive Folder ID for user %s to %s", current_user.id, request.folder_id)
     return {"message": "Google Drive folder ID saved successfully."}
 
 
-@router.post("/drive/sync", response_model=schemas.SimpleResponse)
-async def trigger_drive_sync(
-    # background_tasks: BackgroundTasks, # Inject BackgroundTasks for async execution
+@router.post("/drive/sync", response_model=schemas.SimpleResponse, status_code=status.HTTP_202_ACCEPTED)
+def trigger_drive_sync(
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
-    Triggers the synchronization process for the user's connected Google Drive folder.
-    Downloads files, processes them, and adds to the knowledge base.
+    Queues synchronization of the user's connected Google Drive folder and returns immediately.
+    The sync downloads files, processes them, and adds them to the knowledge base;
+    poll GET /drive/sync/status for the outcome.
+    A plain `def`: get_current_user defers google_refresh_token, so reading it below
+    lazy-loads it with a blocking SELECT, which must run in the threadpool.
     """
     # Validate user has configured Drive folder and has credentials
     if not current_user.drive_folder_id:
@@ -222,25 +359,20 @@ async def trigger_drive_sync(
     if not current_user.google_refresh_token:
          raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Google Drive is not connected or authorization expired.")
 
-    print(f"Received sync request for user {current_user.email}")
+    logger.info("Received sync request for user %s", current_user.id)
 
-    # --- Option A: Run Synchronously (Simpler for now, blocks the request) ---
-    try:
-        # Call the main sync function from the drive service
-        result = sync_drive_folder(user=current_user, db=db)
-        # Return the message provided by the sync function
-        return {"message": result.get("message", "Sync process finished.")}
-    except HTTPException as http_exc:
-         # Re-raise HTTPExceptions (like 401 Unauthorized) from sync_drive_folder
-         raise http_exc
-    except Exception as e:
-         # Catch any other unexpected errors during the sync
-         print(f"Unexpected error during sync trigger for user {current_user.email}: {e}")
-         # Make sure HTTPException is available before raising it
-         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred during sync: {str(e)}")
-
-    # --- Option B: Run as Background Task (Better UX, returns immediately) ---
-    # print(f"Adding sync task to background for user {current_user.email}")
-    # background_tasks.add_task(sync_drive_folder, user=current_user, db=db)
-    # return {"message": "Google Drive synchronization started in the background."}
-    # Note: Requires careful session management if using BackgroundTasks or Celery.
\ No newline at end of file
+    if not start_sync_job(db, current_user.id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A Google Drive sync is already in progress.")
+
+    # Runs after the response is sent, with its own DB session (the request's is closed by then)
+    # (the sync invalidates the user's answer and chain caches as files are ingested)
+    background_tasks.add_task(run_sync_job, current_user.id)
+    return {"message": "Google Drive synchronization started in the background."}
+
+@router.get("/drive/sync/status", response_model=schemas.DriveSyncStatus)
+def get_drive_sync_status(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Returns the status of the user's latest Google Drive sync."""
+    return get_sync_job_status(db, current_user.id) or {"status": "idle"}
@@ -0,0 +1,97 @@
+# backend/app/core/cors.py
+
+# Methods a preflight may request. With credentials allowed, browsers treat a literal "*"
+# as a method name rather than a wildcard, so the list is spelled out.
+_ALL_METHODS = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+# Static parts of the CORS responses, encoded once at import. Only the echoed origin
+# (and, on preflights, the requested headers) varies per request.
+CORS_PREFLIGHT_HEADERS = (
+    (b"access-control-allow-methods", _ALL_METHODS),
+    (b"access-control-allow-credentials", b"true"),
+    (b"access-control-max-age", b"600"),
+    (b"vary", b"Origin"),
+)
+CORS_SIMPLE_HEADERS = (
+    (b"access-control-allow-credentials", b"true"),
+    (b"vary", b"Origin"),
+)
+
+class FastCORS:
+    """
+    Pure-ASGI CORS middleware for a fixed list of origins, with any method and header
+    allowed and credentials permitted (what the app configured on Starlette's
+    CORSMiddleware).
+
+    Works on the raw scope headers and `send` messages: no Request/Headers objects per
+    request. Preflights are answered here without reaching the app; other requests from
+    an allowed origin get the CORS headers appended to their response start message.
+    """
+
+    def __init__(self, app, allowed_origins: frozenset[bytes]):
+        self.app = app
+        # Encoded once at startup (see main.py): the raw Origin header bytes from the scope
+        # are looked up directly, with no per-request decode or lower()
+        self.origins = allowed_origins
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        requested_headers = None
+        is_preflight = False
+        for name, value in scope["headers"]: # Lower-cased header names, per the ASGI spec
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                is_preflight = True
+            elif name == b"access-control-request-headers":
+                requested_headers = value
+
+        if origin is None: # Same-origin or non-browser request
+            await self.app(scope, receive, send)
+            return
+
+        if is_preflight and scope["method"] == "OPTIONS":
+            await self._preflight(origin, requested_headers, send)
+            return
+
+        if origin not in self.origins:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"access-control-allow-origin", origin),
+                    *CORS_SIMPLE_HEADERS
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(self, origin: bytes, requested_headers, send):
+        if origin not in self.origins:
+            body = b"Disallowed CORS origin"
+            await send({
+                "type": "http.response.start",
+                "status": 400,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode("ascii")),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        headers = [(b"access-control-allow-origin", origin), *CORS_PREFLIGHT_HEADERS]
+        if requested_headers:
+            # Any header is allowed: echo the requested list (a literal "*" is not a
+            # wildcard on credentialed requests)
+            headers.append((b"access-control-allow-headers", requested_headers))
+        headers.append((b"content-length", b"0"))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
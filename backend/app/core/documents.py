@@ -0,0 +1,117 @@
+# backend/app/core/documents.py
+
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+def record_document(
+    db: Session,
+    owner_id: int,
+    filename: str,
+    chunk_ids: list[str],
+    md5_checksum: str = None,
+    modified_time: datetime = None,
+    embedding_model: str = None
+) -> list[str]:
+    """
+    Records an ingested file and the Chroma IDs of its chunks (does not commit).
+
+    Upserts the Document row (bumping uploaded_at on re-ingest) and replaces its chunk rows.
+    `md5_checksum` / `modified_time` identify the Drive version ingested; direct uploads
+    leave them NULL, so a later Drive sync of the same name re-ingests it.
+    `embedding_model` records the model key the chunks were embedded with.
+    Returns the IDs a previous version of the file had that the new one no longer uses,
+    so the caller can remove those vectors from Chroma after committing.
+    """
+    return record_documents(db, owner_id, [{
+        "filename": filename,
+        "chunk_ids": chunk_ids,
+        "md5_checksum": md5_checksum,
+        "modified_time": modified_time,
+        "embedding_model": embedding_model
+    }])
+
+def record_documents(db: Session, owner_id: int, files: list[dict]) -> list[str]:
+    """
+    Records several ingested files at once; same semantics as record_document (does not commit).
+
+    `files` holds dicts with filename, chunk_ids, md5_checksum, modified_time and
+    embedding_model; filenames
+    must be distinct (Postgres rejects an upsert that touches the same row twice).
+    Issues one statement per table regardless of the number of files.
+    Returns the stale chunk IDs across all the files.
+    """
+    if not files:
+        return []
+
+    # Insert, or bump the timestamp on re-upload, and get the row ids back in the same round-trip
+    insert_stmt = pg_insert(models.Document).values([
+        {
+            "original_filename": file["filename"],
+            "owner_id": owner_id,
+            "md5_checksum": file["md5_checksum"],
+            "modified_time": file["modified_time"],
+            "embedding_model": file["embedding_model"]
+        }
+        for file in files
+    ])
+    # RETURNING order is not guaranteed to follow VALUES order, so map ids by filename
+    document_ids = dict(db.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["owner_id", "original_filename"],
+            set_={
+                "uploaded_at": insert_stmt.excluded.uploaded_at,
+                "md5_checksum": insert_stmt.excluded.md5_checksum,
+                "modified_time": insert_stmt.excluded.modified_time,
+                "embedding_model": insert_stmt.excluded.embedding_model
+            }
+        ).returning(models.Document.original_filename, models.Document.id)
+    ).all())
+
+    previous_ids = db.scalars(
+        delete(models.DocumentChunk)
+        .where(models.DocumentChunk.document_id.in_(document_ids.values()))
+        .returning(models.DocumentChunk.id)
+    ).all()
+
+    # Bulk insert via Core (executemany), no ORM objects
+    chunk_rows = [
+        {"id": chunk_id, "document_id": document_ids[file["filename"]], "owner_id": owner_id}
+        for file in files
+        for chunk_id in file["chunk_ids"]
+    ]
+    if chunk_rows:
+        db.execute(insert(models.DocumentChunk), chunk_rows)
+
+    current_ids = {chunk_id for file in files for chunk_id in file["chunk_ids"]}
+    return [chunk_id for chunk_id in previous_ids if chunk_id not in current_ids]
+
+def get_chunk_ids(db: Session, owner_id: int, filename: str) -> list[str]:
+    """Returns the Chroma IDs recorded for one of the user's documents."""
+    return db.scalars(
+        select(models.DocumentChunk.id)
+        .join(models.Document, models.Document.id == models.DocumentChunk.document_id)
+        .where(
+            models.Document.owner_id == owner_id,
+            models.Document.original_filename == filename
+        )
+    ).all()
+
+def get_drive_versions(db: Session, owner_id: int) -> dict[str, tuple]:
+    """
+    Returns filename -> (md5_checksum, modified_time, embedding_model) for the user's
+    documents, in one query.
+    """
+    rows = db.execute(
+        select(
+            models.Document.original_filename,
+            models.Document.md5_checksum,
+            models.Document.modified_time,
+            models.Document.embedding_model
+        ).where(models.Document.owner_id == owner_id)
+    )
+    return {filename: (md5, modified, model) for filename, md5, modified, model in rows}
@@ -1,38 +1,53 @@
 # backend/app/core/drive_service.py
 
-import io
+import hashlib
+import logging
 import os
 import tempfile # For creating temporary files
-from datetime import datetime, timezone
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException, status # Import status and HTTPException
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp # Per-thread authorized connections
+import httplib2
 # Flow is not directly used here but related to the overall auth process
 # from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build # Builds the service object
 from googleapiclient.http import MediaIoBaseDownload # Handles file downloads
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app import models # Database User model
-from app.core.config import settings # Application settings
+from app.database import SessionLocal # Background jobs open their own sessions
+from app.core.config import settings, GOOGLE_OAUTH_SCOPES # Application settings
 # Import RAG processing functions
 from app.core import rag
+from app.core import documents
+from app.core import semantic_cache
+from app.core.parsing import get_parse_pool, load_and_chunk
 
-# Ensure SCOPES match those defined in api/auth.py
-SCOPES = [
-    'openid',
-    'https://www.googleapis.com/auth/userinfo.email',
-    'https://www.googleapis.com/auth/userinfo.profile',
-    # --- ENSURE ONLY READONLY IS HERE ---
-    'https://www.googleapis.com/auth/drive.readonly'
-    # --- REMOVE drive.file ---
-]
+logger = logging.getLogger(__name__)
+
+# Same scopes the user granted during OAuth (defined once in core/config.py)
+SCOPES = GOOGLE_OAUTH_SCOPES
+
+# Shared transport for token refreshes (keeps its HTTP connection pool across calls)
+_TOKEN_REFRESH_REQUEST = Request()
+
+# user_id -> (refresh token, credentials, Drive service). Reused until the access token is
+# within _TOKEN_EXPIRY_MARGIN of expiring, skipping the token refresh and build() per call.
+_drive_client_cache: dict[int, tuple[str, Credentials, object]] = {}
+_drive_client_cache_lock = threading.Lock()
+_TOKEN_EXPIRY_MARGIN = timedelta(seconds=60)
 
 ## Authentication
 # ================
-def get_drive_service(user: models.User, db: Session):
+def get_drive_credentials(user: models.User, db: Session) -> Credentials:
     """
-    Authenticates with Google Drive API using stored user credentials.
+    Builds valid Google API credentials from the user's stored refresh token.
 
     Refreshes the access token if necessary using the stored refresh token
     and updates the expiry time in the database.
@@ -42,19 +57,14 @@ def get_drive_service(user: models.User, db: Session):
         db: The SQLAlchemy database session.
 
     Returns:
-        A Google API client service object for Google Drive API v3.
+        Refreshed google.oauth2 Credentials.
 
     Raises:
         ValueError: If the user lacks a refresh token or credentials are invalid.
-        Exception: If token refresh fails or the Google Drive service build fails.
+        Exception: If token refresh fails.
     """
-    print("-" * 20)
-    print("get_drive_service called:")
-    print(f"User: {user.email}")
-    print(f"Stored refresh token: {user.google_refresh_token[:10] if user.google_refresh_token else 'None'}")
-
     if not user.google_refresh_token:
-        print(f"User {user.email} missing Google refresh token.")
+        logger.warning("User %s missing Google refresh token.", user.id)
         raise ValueError("Google account not fully connected or refresh token missing.")
 
     # Create credentials object from stored data
@@ -69,22 +79,22 @@ def get_drive_service(user: models.User, db: Session):
 
     # Attempt refresh if credentials are not valid AND a refresh token exists
     if not credentials.valid and credentials.refresh_token:
-        print(f"Credentials not valid. Attempting refresh for {user.email}...")
+        logger.debug("Credentials not valid. Attempting refresh for user %s...", user.id)
         try:
             # Force refresh attempt
-            credentials.refresh(Request())
-            print("Token refreshed successfully via credentials.refresh().")
+            credentials.refresh(_TOKEN_REFRESH_REQUEST)
+            logger.debug("Token refreshed successfully via credentials.refresh().")
             # Update expiry in DB if present
             if credentials.expiry:
                 user.google_token_expiry = credentials.expiry.replace(tzinfo=timezone.utc)
                 db.commit()
-                print(f"Updated token expiry in DB for user {user.email}")
+                logger.debug("Updated token expiry in DB for user %s", user.id)
             else:
                 user.google_token_expiry = None
                 db.commit()
         except Exception as e:
             # Handle refresh failure (token likely revoked or invalid)
-            print(f"!!! credentials.refresh() FAILED for user {user.email}: {e}")
+            logger.warning("credentials.refresh() failed for user %s: %s", user.id, e)
             # Consider invalidating the stored token as it's unusable
             # user.google_refresh_token = None
             # user.google_token_expiry = None
@@ -93,30 +103,81 @@ def get_drive_service(user: models.User, db: Session):
             raise Exception(f"Could not refresh Google API token (likely revoked or invalid): {e}")
     elif not credentials.valid and not credentials.refresh_token:
          # Should not happen if we check user.google_refresh_token earlier, but good failsafe
-         print(f"Credentials invalid and no refresh token available for user {user.email}")
+         logger.warning("Credentials invalid and no refresh token available for user %s", user.id)
          raise ValueError("Invalid Google credentials and no refresh token found.")
 
-    # If credentials are now valid (either initially or after refresh)
-    if credentials.valid:
-        try:
-            # Build the Google Drive API service client (v3)
-            service = build('drive', 'v3', credentials=credentials)
-            print(f"Google Drive service built successfully.")
-            print("-" * 20)
-            return service
-        except Exception as e:
-             print(f"!!! Error building Google Drive service: {e}")
-             print("-" * 20)
-             raise Exception(f"Could not build Google Drive service: {e}")
-    else:
+    if not credentials.valid:
         # Should only reach here if refresh failed above and wasn't caught/raised properly
-        print(f"Credentials remain invalid after refresh check for user {user.email}")
+        logger.warning("Credentials remain invalid after refresh check for user %s", user.id)
         raise ValueError("Invalid Google credentials after refresh attempt.")
+    return credentials
+
+def build_drive_service(credentials: Credentials):
+    """Builds the Google Drive API v3 service client for already-valid credentials."""
+    try:
+        # Bundled static discovery document; no discovery fetch or file cache lookups
+        service = build('drive', 'v3', credentials=credentials, cache_discovery=False, static_discovery=True)
+        logger.debug("Google Drive service built successfully.")
+        return service
+    except Exception as e:
+         logger.exception("Error building Google Drive service")
+         raise Exception(f"Could not build Google Drive service: {e}")
+
+def get_drive_client(user: models.User, db: Session) -> tuple[Credentials, object]:
+    """
+    Returns (credentials, Drive service) for the user, reusing the cached pair while
+    its access token is still comfortably valid.
+
+    Raises:
+        ValueError: If the user lacks a refresh token or credentials are invalid.
+        Exception: If token refresh fails or the Google Drive service build fails.
+    """
+    with _drive_client_cache_lock:
+        cached = _drive_client_cache.get(user.id)
+    if cached is not None:
+        refresh_token, credentials, service = cached
+        # google-auth keeps expiry as naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        # A reconnected account has a new refresh token; don't serve the old grant
+        if refresh_token == user.google_refresh_token and credentials.expiry and now < credentials.expiry - _TOKEN_EXPIRY_MARGIN:
+            return credentials, service
+
+    credentials = get_drive_credentials(user, db)
+    service = build_drive_service(credentials)
+    with _drive_client_cache_lock:
+        _drive_client_cache[user.id] = (user.google_refresh_token, credentials, service)
+    return credentials, service
+
+def get_drive_service(user: models.User, db: Session):
+    """
+    Authenticates with Google Drive API using stored user credentials.
+
+    Returns:
+        A Google API client service object for Google Drive API v3.
+
+    Raises:
+        ValueError: If the user lacks a refresh token or credentials are invalid.
+        Exception: If token refresh fails or the Google Drive service build fails.
+    """
+    return get_drive_client(user, db)[1]
 
 
 ## File Operations
 # =================
 
+# MIME types for supported files (PDF, DOCX, CSV)
+SUPPORTED_MIME_TYPES = (
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document", # DOCX
+    "text/csv"
+)
+# Files-list query, built once; only the folder ID is filled in per call
+_DRIVE_QUERY_TEMPLATE = (
+    "'{folder_id}' in parents and mimeType != 'application/vnd.google-apps.folder' and trashed = false and ("
+    + " or ".join(f"mimeType='{mt}'" for mt in SUPPORTED_MIME_TYPES)
+    + ")"
+)
+
 def list_files_in_folder(service, folder_id: str):
     """
     Lists supported files (PDF, DOCX, CSV) within a given Google Drive folder ID.
@@ -126,23 +187,14 @@ def list_files_in_folder(service, folder_id: str):
         folder_id: The ID of the Google Drive folder to scan.
 
     Returns:
-        A list of dictionaries, each containing 'id' and 'name' of a relevant file.
+        A list of dictionaries, each containing 'id', 'name', 'modifiedTime', 'md5Checksum'
+        and 'size' of a relevant file (version fields may be None).
         Returns an empty list if the folder is empty or on error during listing.
     """
     files_list = []
     page_token = None
-    # Define MIME types for supported files (without extra quotes initially)
-    supported_mime_types = [
-        "application/pdf",
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document", # DOCX
-        "text/csv"
-    ]
-    # Construct the 'mimeType = ... or mimeType = ...' part correctly
-    mime_type_conditions = " or ".join([f"mimeType='{mt}'" for mt in supported_mime_types])
-
-    # Construct the full query, ensuring correct spacing and parentheses
-    query = f"'{folder_id}' in parents and mimeType != 'application/vnd.google-apps.folder' and trashed = false and ({mime_type_conditions})"
-    print(f"Querying Google Drive with: {query}")
+    query = _DRIVE_QUERY_TEMPLATE.format(folder_id=folder_id)
+    logger.debug("Querying Google Drive with: %s", query)
 
     try:
         # Loop to handle pagination of results from the Drive API
@@ -150,31 +202,58 @@ def list_files_in_folder(service, folder_id: str):
             results = service.files().list(
                 q=query,
                 spaces='drive', # Search within Google Drive space
-                fields='nextPageToken, files(id, name)', # Specify required fields (id, name)
+                fields='nextPageToken, files(id, name, modifiedTime, md5Checksum, size)', # Version fields let sync skip unchanged files
                 pageToken=page_token
             ).execute()
 
             items = results.get('files', [])
             if items:
-                print(f"Found {len(items)} files in current page...")
+                logger.debug("Found %d files in current page...", len(items))
                 # Add found file details (id and name) to the list
-                files_list.extend([{'id': item['id'], 'name': item['name']} for item in items])
+                files_list.extend([
+                    {
+                        'id': item['id'],
+                        'name': item['name'],
+                        'modifiedTime': item.get('modifiedTime'),
+                        'md5Checksum': item.get('md5Checksum'),
+                        'size': item.get('size')
+                    }
+                    for item in items
+                ])
 
             # Get token for the next page, if it exists
             page_token = results.get('nextPageToken', None)
             if page_token is None:
                 break # Exit loop if this was the last page
 
-        print(f"Found total {len(files_list)} relevant files in folder '{folder_id}'.")
+        logger.info("Found total %d relevant files in folder '%s'.", len(files_list), folder_id)
         return files_list
 
-    except Exception as e:
-        print(f"An error occurred while listing files in folder '{folder_id}': {e}")
+    except Exception:
+        logger.exception("An error occurred while listing files in folder '%s'", folder_id)
         # Consider specific error handling (e.g., permissions error, folder not found)
         return [] # Return an empty list on error
 
 
-def download_file(service, file_id: str, file_name: str, temp_dir: str) -> str | None:
+class _HashingWriter:
+    """
+    File wrapper that feeds every chunk written through it to a hash, so a download is
+    checksummed in the same pass that writes it (no re-read of the file afterwards).
+    """
+
+    def __init__(self, fh, hasher):
+        self._fh = fh
+        self._hasher = hasher
+
+    def write(self, data):
+        self._hasher.update(data)
+        return self._fh.write(data)
+
+    def __getattr__(self, name):
+        # Anything else MediaIoBaseDownload needs goes to the real file
+        return getattr(self._fh, name)
+
+def download_file(service, file_id: str, file_name: str, temp_dir: str, http=None) -> tuple[str, str] | None:
     """
     Downloads a file from Google Drive to a specified temporary directory.
 
@@ -183,59 +262,83 @@ def download_file(service, file_id: str, file_name: str, temp_dir: str) -> str |
         file_id: The ID of the Google Drive file to download.
         file_name: The original name of the file (used for saving).
         temp_dir: The directory to save the downloaded file in.
+        http: Optional authorized HTTP object to send the request with. The service's own
+            httplib2 connection is not thread-safe, so concurrent downloads each pass one.
 
     Returns:
-        The full path to the downloaded temporary file, or None if download fails.
+        (path to the downloaded temporary file, MD5 hex digest of its bytes), or None if
+        download fails. The MD5 is comparable with Drive's md5Checksum field.
     """
     # Construct the full path within the provided temporary directory
     temp_file_path = os.path.join(temp_dir, f"drive_{file_id}_{file_name}")
-    print(f"Attempting to download file ID '{file_id}' ({file_name}) to '{temp_file_path}'...")
+    logger.debug("Downloading file ID '%s' (%s) to '%s'...", file_id, file_name, temp_file_path)
     try:
         # Prepare the file download request using the Drive API
         request = service.files().get_media(fileId=file_id)
-        # Use an in-memory buffer (BytesIO) to handle the download stream efficiently
-        fh = io.BytesIO()
-        # Create a MediaIoBaseDownload object to manage the download process (handles chunking)
-        downloader = MediaIoBaseDownload(fh, request)
-
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                print(f"Download {int(status.progress() * 100)}%.") # Progress indicator
-
-        # Once download is complete, write the buffer's content to the temporary file
-        fh.seek(0) # Go to the beginning of the buffer
-        with open(temp_file_path, 'wb') as f:
-            f.write(fh.read()) # Write content to the named temp file
-
-        print(f"Successfully downloaded '{file_name}' to temporary path.")
-        return temp_file_path # Return the path to the downloaded file
-
-    except Exception as e:
-        print(f"An error occurred downloading file ID '{file_id}' ({file_name}): {e}")
+        if http is not None:
+            request.http = http
+        # Stream straight into the temp file: no in-memory copy of the whole file,
+        # hashing each chunk as it is written
+        md5 = hashlib.md5(usedforsecurity=False)
+        with open(temp_file_path, 'wb') as fh:
+            # Create a MediaIoBaseDownload object to manage the download process (handles chunking)
+            downloader = MediaIoBaseDownload(_HashingWriter(fh, md5), request)
+
+            done = False
+            while not done:
+                status, done = downloader.next_chunk()
+                if status:
+                    logger.debug("Download %d%%.", int(status.progress() * 100)) # Progress indicator
+
+        logger.debug("Successfully downloaded '%s' to temporary path.", file_name)
+        return temp_file_path, md5.hexdigest() # Path to the downloaded file and its checksum
+
+    except Exception:
+        logger.exception("An error occurred downloading file ID '%s' (%s)", file_id, file_name)
         # Clean up the temporary file if it was created and an error occurred
         if os.path.exists(temp_file_path):
             try:
                 os.remove(temp_file_path)
-                print(f"Cleaned up partially downloaded temporary file: {temp_file_path}")
+                logger.debug("Cleaned up partially downloaded temporary file: %s", temp_file_path)
             except OSError as cleanup_error:
-                print(f"Error cleaning up temporary file {temp_file_path}: {cleanup_error}")
+                logger.warning("Error cleaning up temporary file %s: %s", temp_file_path, cleanup_error)
         return None # Indicate download failure
 
 
 ## Sync Orchestration
 # ==================
 
+# Chunks buffered across files before one combined Chroma write during a sync
+CHROMA_FLUSH_CHUNKS = 512
+
+def _parse_drive_time(value: str | None) -> datetime | None:
+    """Parses a Drive RFC 3339 timestamp (e.g. '2024-05-01T12:00:00.000Z')."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+def _is_unchanged(file_info: dict, known_version: tuple | None) -> bool:
+    """
+    True if the listed Drive file is the same version as the one already ingested, and
+    its chunks were embedded with the current model (otherwise it must be re-embedded).
+    """
+    if known_version is None:
+        return False
+    md5_checksum, modified_time, embedding_model = known_version
+    if embedding_model != rag.EMBEDDING_MODEL_KEY:
+        return False
+    if file_info['md5Checksum'] and md5_checksum:
+        return file_info['md5Checksum'] == md5_checksum
+    # No checksum on one side: fall back to the modification time
+    return modified_time is not None and _parse_drive_time(file_info['modifiedTime']) == modified_time
+
 def sync_drive_folder(user: models.User, db: Session):
     """
     Performs the full sync process for a user's selected Google Drive folder.
 
     1. Authenticates with Google Drive using the user's refresh token.
     2. Lists supported files (PDF, DOCX, CSV) in the user's specified folder.
-    3. Downloads each file to a temporary location.
-    4. Processes each file using the RAG pipeline (load, chunk, add to ChromaDB).
-    5. Records the processed file's name in PostgreSQL if not already present.
+    3. Downloads each file to a temporary location (several files concurrently).
+    4. Processes each file using the RAG pipeline (load and chunk in parallel, then add to ChromaDB).
+    5. Records the processed file and its chunk IDs in PostgreSQL.
     6. Cleans up temporary files.
 
     Args:
@@ -250,114 +353,290 @@ def sync_drive_folder(user: models.User, db: Session):
     """
     # Check if a folder ID is configured for the user
     if not user.drive_folder_id:
-        print(f"User {user.email} has no Drive Folder ID set. Skipping sync.")
+        logger.info("User %s has no Drive Folder ID set. Skipping sync.", user.id)
         # Return a status that the frontend can understand
         return {"status": "skipped", "message": "No Google Drive folder ID is configured."}
 
-    print(f"Starting Google Drive sync for user {user.email}, folder ID: {user.drive_folder_id}")
+    logger.info("Starting Google Drive sync for user %s, folder ID: %s", user.id, user.drive_folder_id)
     processed_files_count = 0
     failed_files_info = []
 
     try:
         # 1. Authenticate and get the Google Drive service object
-        drive_service = get_drive_service(user, db)
+        credentials, drive_service = get_drive_client(user, db)
 
         # 2. List relevant files in the specified folder
-        files_to_process = list_files_in_folder(drive_service, user.drive_folder_id)
+        listed_files = list_files_in_folder(drive_service, user.drive_folder_id)
+
+        # Skip files whose Drive version matches what was last ingested (no download, no embedding)
+        known_versions = documents.get_drive_versions(db, user.id)
+        files_to_process = [f for f in listed_files if not _is_unchanged(f, known_versions.get(f['name']))]
+        unchanged_count = len(listed_files) - len(files_to_process)
 
         if not files_to_process:
-            print(f"No new supported files found in folder {user.drive_folder_id} for user {user.email}.")
-            return {"status": "success", "message": "No new files found to process.", "processed_count": 0, "failed_files": []}
+            logger.info("No new supported files found in folder %s for user %s.", user.drive_folder_id, user.id)
+            return {"status": "success", "message": "No new files found to process.", "processed_count": 0, "unchanged_count": unchanged_count, "failed_files": []}
 
         # Create a single temporary directory for all downloads in this sync run
         with tempfile.TemporaryDirectory(prefix="drive_sync_") as temp_dir:
-            print(f"Using temporary directory for downloads: {temp_dir}")
-
-            # Iterate through the files found in the Drive folder
-            for file_info in files_to_process:
+            logger.debug("Using temporary directory for downloads: %s", temp_dir)
+
+            # httplib2 connections are not thread-safe: each worker gets its own authorized one
+            thread_http = threading.local()
+
+            def fetch_and_chunk(file_info):
+                """
+                Downloads, loads and chunks one file on a worker thread.
+                Returns (file_info, chunks, failure reason); chunks is None on failure.
+                """
+                if not hasattr(thread_http, "http"):
+                    thread_http.http = AuthorizedHttp(credentials, http=httplib2.Http())
                 file_id = file_info['id']
                 file_name = file_info['name']
-                temp_file_path = None # Ensure path is reset for each loop iteration
-
+                temp_file_path = None
                 try:
-                    print(f"\nProcessing file: {file_name} (ID: {file_id})")
-                    # 3. Download the file
-                    # Pass the shared temporary directory to the download function
-                    temp_file_path = download_file(drive_service, file_id, file_name, temp_dir)
-
-                    if temp_file_path:
-                        # 4. Process the downloaded file using the RAG pipeline
-                        print(f"Loading and chunking {file_name} from {temp_file_path}...")
-                        pages = rag.load_document(temp_file_path)
-                        chunks = rag.chunk_document(pages)
-
-                        if chunks:
-                            print(f"Adding {len(chunks)} chunks from {file_name} to ChromaDB...")
-                            # Add chunks to ChromaDB with user ID and filename metadata
-                            rag.add_documents_to_chroma(
-                                chunks=chunks,
-                                user_id=user.id,
-                                source_filename=file_name
-                            )
-                            processed_files_count += 1
-
-                            # 5. Record the filename in PostgreSQL if it's new for this user
-                            existing_doc = db.query(models.Document).filter(
-                                models.Document.owner_id == user.id,
-                                models.Document.original_filename == file_name
-                            ).first()
-                            if not existing_doc:
-                                new_doc_record = models.Document(original_filename=file_name, owner_id=user.id)
-                                db.add(new_doc_record)
-                                db.commit() # Commit after each successful file to save progress
-                                print(f"Recorded '{file_name}' in PostgreSQL.")
-                            else:
-                                print(f"'{file_name}' already recorded in PostgreSQL.")
-                        else:
-                            print(f"Skipping '{file_name}' as no chunks were generated (empty or unparsable).")
-                            failed_files_info.append(f"{file_name} (empty/unparsable)")
-                    else:
-                        print(f"Skipping '{file_name}' due to download failure.")
-                        failed_files_info.append(f"{file_name} (download failed)")
-
+                    logger.debug("Processing file: %s (ID: %s)", file_name, file_id)
+                    # 3. Download the file into the shared temporary directory
+                    downloaded = download_file(drive_service, file_id, file_name, temp_dir, http=thread_http.http)
+                    if not downloaded:
+                        return file_info, None, "download failed"
+                    temp_file_path, local_md5 = downloaded
+                    # Drive reports md5Checksum for binary files; a mismatch means a truncated
+                    # or corrupted download, which must not be recorded as this version
+                    if file_info['md5Checksum'] and local_md5 != file_info['md5Checksum']:
+                        return file_info, None, "checksum mismatch"
+
+                    # 4. Load and chunk the downloaded file in the parse process pool
+                    # (this thread just waits, so parsing runs on several cores)
+                    logger.debug("Loading and chunking %s from %s...", file_name, temp_file_path)
+                    chunks = get_parse_pool().submit(load_and_chunk, temp_file_path).result()
+                    if not chunks:
+                        return file_info, None, "empty/unparsable"
+                    return file_info, chunks, None
                 except Exception as file_processing_error:
-                    # Catch errors during processing of a single file
-                    print(f"Error processing file {file_name} (ID: {file_id}): {file_processing_error}")
-                    failed_files_info.append(f"{file_name} (processing error: {file_processing_error})")
-                    # Rollback potential DB changes for this specific file
-                    db.rollback()
+                    logger.exception("Error processing file %s (ID: %s)", file_name, file_id)
+                    return file_info, None, f"processing error: {file_processing_error}"
                 finally:
                     # 6. Clean up the individual temporary file immediately after processing
                     if temp_file_path and os.path.exists(temp_file_path):
                         try:
                             os.remove(temp_file_path)
-                            print(f"Cleaned up temp file: {temp_file_path}")
+                            logger.debug("Cleaned up temp file: %s", temp_file_path)
                         except OSError as cleanup_error:
-                             print(f"Error cleaning up temp file {temp_file_path}: {cleanup_error}")
+                             logger.warning("Error cleaning up temp file %s: %s", temp_file_path, cleanup_error)
+
+            # Parsed files waiting to be written to Chroma together: (file_info, chunks)
+            pending_files = []
+
+            def flush_pending():
+                """Writes all pending files to Chroma in one batch, then records each in PostgreSQL."""
+                nonlocal processed_files_count
+                if not pending_files:
+                    return
+                batch = list(pending_files)
+                pending_files.clear()
+                try:
+                    logger.debug("Adding %d chunks from %d files to ChromaDB...", sum(len(c) for _, c in batch), len(batch))
+                    # Add chunks to ChromaDB in the user's collection with filename metadata
+                    ids_per_file = rag.add_documents_to_chroma_batch(
+                        [(chunks, file_info['name']) for file_info, chunks in batch],
+                        user_id=user.id
+                    )
+                except Exception as chroma_error:
+                    logger.exception("Error adding %d files to ChromaDB", len(batch))
+                    failed_files_info.extend(
+                        f"{file_info['name']} (processing error: {chroma_error})" for file_info, _ in batch
+                    )
+                    return
+
+                records = [
+                    {
+                        "filename": file_info['name'],
+                        "chunk_ids": chunk_ids,
+                        "md5_checksum": file_info['md5Checksum'],
+                        "modified_time": _parse_drive_time(file_info['modifiedTime']),
+                        "embedding_model": rag.EMBEDDING_MODEL_KEY
+                    }
+                    for (file_info, _), chunk_ids in zip(batch, ids_per_file)
+                ]
+                try:
+                    # 5. Record the whole batch in PostgreSQL: one upsert and one commit per flush
+                    stale_ids = documents.record_documents(db, user.id, records)
+                    db.commit()
+                    recorded_count = len(batch)
+                except Exception:
+                    logger.exception("Batch record of %d files failed; recording them one by one", len(batch))
+                    db.rollback()
+                    # Fall back per file, so one bad row does not fail the rest of the batch
+                    stale_ids, recorded_count = [], 0
+                    for (file_info, _), record in zip(batch, records):
+                        try:
+                            stale_ids += documents.record_documents(db, user.id, [record])
+                            db.commit()
+                            recorded_count += 1
+                        except Exception as file_processing_error:
+                            logger.exception("Error processing file %s (ID: %s)", file_info['name'], file_info['id'])
+                            failed_files_info.append(f"{file_info['name']} (processing error: {file_processing_error})")
+                            # Rollback potential DB changes for this specific file
+                            db.rollback()
+
+                logger.debug("Recorded %d files in PostgreSQL.", recorded_count)
+                processed_files_count += recorded_count
+                try:
+                    # Drop chunks previous, longer versions of the files left behind
+                    rag.delete_chunks_from_chroma(user.id, stale_ids)
+                except Exception:
+                    # The files are already recorded; leftover vectors only add retrieval noise
+                    logger.exception("Failed to delete %d stale chunks for user %s", len(stale_ids), user.id)
+
+                if recorded_count:
+                    # New content is queryable now: drop answers and the chain cached before it
+                    semantic_cache.invalidate_user(user.id)
+                    rag.invalidate_qa_chain(user.id)
+
+            # Downloads and parsing run concurrently (at most DRIVE_SYNC_CONCURRENCY at a time,
+            # which also bounds Drive API load); embedding, Chroma and DB writes stay on this
+            # thread (the session is not thread-safe). Files are ingested in completion order,
+            # so network and parsing for later files overlap with ingest of earlier ones.
+            with ThreadPoolExecutor(max_workers=settings.DRIVE_SYNC_CONCURRENCY) as executor:
+                futures = [executor.submit(fetch_and_chunk, file_info) for file_info in files_to_process]
+                for future in as_completed(futures):
+                    file_info, chunks, failure = future.result()
+                    if failure:
+                        logger.warning("Skipping '%s': %s.", file_info['name'], failure)
+                        failed_files_info.append(f"{file_info['name']} ({failure})")
+                        continue
+
+                    # Buffer files and write them to Chroma together, bounding memory per flush.
+                    # Drive allows duplicate names; one batch must not repeat a filename's chunk IDs.
+                    pending_files[:] = [p for p in pending_files if p[0]['name'] != file_info['name']]
+                    pending_files.append((file_info, chunks))
+                    if sum(len(c) for _, c in pending_files) >= CHROMA_FLUSH_CHUNKS:
+                        flush_pending()
+            flush_pending()
             # The 'with tempfile.TemporaryDirectory' context manager automatically cleans up the directory
 
         # Log and return the final status of the sync operation
-        print(f"Sync completed for user {user.email}. Processed: {processed_files_count}, Failed: {len(failed_files_info)}")
+        logger.info("Sync completed for user %s. Processed: %d, Unchanged: %d, Failed: %d", user.id, processed_files_count, unchanged_count, len(failed_files_info))
         return {
             "status": "success",
-            "message": f"Sync completed. Processed {processed_files_count} files.",
+            "message": f"Sync completed. Processed {processed_files_count} files ({unchanged_count} unchanged).",
             "processed_count": processed_files_count,
+            "unchanged_count": unchanged_count,
             "failed_files": failed_files_info # List failed filenames and reasons
         }
 
     except ValueError as auth_error: # Catch specific auth errors from get_drive_service
-        print(f"Authentication error during sync for user {user.email}: {auth_error}")
+        logger.warning("Authentication error during sync for user %s: %s", user.id, auth_error)
         # Reraise as HTTPException for the API endpoint to handle
         # Ensure status is imported from fastapi
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(auth_error))
     except HTTPException as http_exc: # Catch specific HTTPExceptions if raised internally
-         print(f"HTTP Exception during sync: {http_exc.detail}")
+         logger.warning("HTTP Exception during sync: %s", http_exc.detail)
          raise http_exc # Re-raise it
     except Exception as e:
         # Catch any other unexpected errors during the overall sync process
-        print(f"General error during sync for user {user.email}: {e}")
+        logger.exception("General error during sync for user %s", user.id)
         # Ensure rollback in case of error outside the file loop
         db.rollback()
         # Reraise as HTTPException
         # Ensure status is imported from fastapi
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sync failed unexpectedly: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Sync failed unexpectedly: {str(e)}")
+
+
+## Background Sync Jobs
+# ======================
+
+# Latest sync job per user, stored in the sync_jobs table (models.SyncJob) so that status
+# polls answered by any worker, or after a restart, see the same job.
+_ACTIVE_SYNC_STATUSES = ("queued", "running")
+
+def _sync_job_values(user_id: int, status: str, message: str = None, processed_count: int = None,
+                     unchanged_count: int = None, failed_files: list[str] = None) -> dict:
+    return {
+        "user_id": user_id,
+        "status": status,
+        "message": message,
+        "processed_count": processed_count,
+        "unchanged_count": unchanged_count,
+        "failed_files": failed_files
+    }
+
+def start_sync_job(db: Session, user_id: int) -> bool:
+    """
+    Marks a sync as queued for the user (and commits). Returns False if one is already
+    queued or running. Atomic across workers: the conditional upsert only replaces a
+    finished (or stale) job.
+    """
+    insert_stmt = pg_insert(models.SyncJob).values(
+        **_sync_job_values(user_id, "queued", "Google Drive sync queued.")
+    )
+    stale_before = func.now() - timedelta(seconds=settings.DRIVE_SYNC_STALE_SECONDS)
+    queued = db.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={
+                **{column: insert_stmt.excluded[column] for column in
+                   ("status", "message", "processed_count", "unchanged_count", "failed_files")},
+                "updated_at": func.now()
+            },
+            where=or_(
+                models.SyncJob.status.notin_(_ACTIVE_SYNC_STATUSES),
+                models.SyncJob.updated_at < stale_before
+            )
+        ).returning(models.SyncJob.user_id)
+    ).scalar_one_or_none()
+    db.commit()
+    return queued is not None
+
+def get_sync_job_status(db: Session, user_id: int):
+    """Returns the status of the user's latest sync job, or None if none has run."""
+    job = db.get(models.SyncJob, user_id)
+    if job is None:
+        return None
+    return {
+        "status": job.status,
+        "message": job.message,
+        "processed_count": job.processed_count,
+        "unchanged_count": job.unchanged_count,
+        "failed_files": job.failed_files or []
+    }
+
+def _set_sync_job(db: Session, user_id: int, **job):
+    # A failed sync may leave the session mid-transaction; the status write must still land
+    db.rollback()
+    values = _sync_job_values(user_id, **job)
+    insert_stmt = pg_insert(models.SyncJob).values(**values)
+    db.execute(insert_stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={**{column: values[column] for column in values if column != "user_id"}, "updated_at": func.now()}
+    ))
+    db.commit()
+
+def run_sync_job(user_id: int):
+    """
+    Background entry point for a Drive sync (runs after the HTTP response is sent).
+
+    Opens its own database session, since the request's session is closed by then,
+    and records progress for GET /drive/sync/status.
+    """
+    db = SessionLocal()
+    try:
+        _set_sync_job(db, user_id, status="running", message="Google Drive sync in progress.")
+        user = db.get(models.User, user_id)
+        if user is None:
+            _set_sync_job(db, user_id, status="failed", message="User not found.")
+            return
+        result = sync_drive_folder(user=user, db=db)
+        _set_sync_job(db, user_id, **result)
+    except HTTPException as http_exc:
+        _set_sync_job(db, user_id, status="failed", message=str(http_exc.detail))
+    except Exception as e:
+        logger.exception("Background sync failed for user %s", user_id)
+        try:
+            _set_sync_job(db, user_id, status="failed", message=f"Sync failed unexpectedly: {str(e)}")
+        except Exception:
+            # The job stays "running" until DRIVE_SYNC_STALE_SECONDS lets a new sync replace it
+            logger.exception("Could not record failed sync for user %s", user_id)
+    finally:
+        db.close()
@@ -0,0 +1,133 @@
+# backend/app/core/embedding_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Texts sent to the underlying model per embed_documents call
+EMBED_BATCH_SIZE = 96
+
+# On-disk vector format. float16 halves the cache size versus float32; for unit-scale
+# sentence embeddings the rounding error (~1e-3) does not change nearest neighbours.
+STORAGE_DTYPE = np.float16
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with a two-tier cache so identical text is never re-embedded.
+
+    - An in-process `lru_cache` for query strings (hot, repeated questions).
+    - A persistent SQLite table keyed by (provider, model, sha256(text)) shared across
+      processes and restarts, used for document chunks. Queries are user-supplied free
+      text, so they are kept in memory only: on disk they would grow without bound.
+
+    The `model` key should carry a version tag (e.g. "all-MiniLM-L6-v2@v1"); changing it
+    starts a fresh namespace, so vectors from a previous model are never returned.
+    """
+
+    def __init__(self, underlying: Embeddings, provider: str, model: str, db_path: str, memory_size: int = 10_000):
+        self.underlying = underlying
+        self.provider = provider
+        self.model = model
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        # Drop query rows written before queries became memory-only (index lookup on the key prefix)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE provider = ? AND model = ?",
+            (self.provider, self._namespace("query"))
+        )
+        self._conn.commit()
+        self._embed_query_cached = lru_cache(maxsize=memory_size)(self._embed_query_uncached)
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
+        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                sha256 BLOB NOT NULL,
+                vec BLOB NOT NULL,
+                PRIMARY KEY (provider, model, sha256)
+            )
+            """
+        )
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def _namespace(self, kind: str) -> str:
+        # Query and document embeddings differ for some models, so keep them apart.
+        # The storage dtype is part of the key so rows written in another format are never misread.
+        return f"{self.model}:{kind}:{np.dtype(STORAGE_DTYPE).name}"
+
+    def _load(self, kind: str, digests: list[bytes]) -> dict[bytes, list[float]]:
+        if not digests:
+            return {}
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(digests), 500):
+                batch = digests[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT sha256, vec FROM embeddings WHERE provider = ? AND model = ? AND sha256 IN ({placeholders})",
+                    [self.provider, self._namespace(kind), *batch]
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=STORAGE_DTYPE).astype(np.float32).tolist()
+        return found
+
+    def _store(self, kind: str, items: list[tuple[bytes, list[float]]]) -> None:
+        if not items:
+            return
+        namespace = self._namespace(kind)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (provider, model, sha256, vec) VALUES (?, ?, ?, ?)",
+                [
+                    (self.provider, namespace, digest, np.asarray(vec, dtype=STORAGE_DTYPE).tobytes())
+                    for digest, vec in items
+                ]
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embeds texts, computing only those missing from the persistent cache."""
+        digests = [self._digest(text) for text in texts]
+        cached = self._load("document", list(set(digests)))
+
+        # Embed each distinct uncached text once
+        missing = {}
+        for digest, text in zip(digests, texts):
+            if digest not in cached and digest not in missing:
+                missing[digest] = text
+        # One model call per batch instead of per chunk; persist each batch as it completes
+        pending = iter(missing.items())
+        while batch := list(islice(pending, EMBED_BATCH_SIZE)):
+            batch_digests, batch_texts = zip(*batch)
+            vectors = self.underlying.embed_documents(list(batch_texts))
+            new_items = list(zip(batch_digests, vectors))
+            self._store("document", new_items)
+            cached.update(new_items)
+
+        return [list(cached[digest]) for digest in digests]
+
+    def _embed_query_uncached(self, text: str) -> tuple[float, ...]:
+        return tuple(self.underlying.embed_query(text))
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embeds a query string, served from memory when repeated in this process."""
+        return list(self._embed_query_cached(text))
@@ -1,9 +1,54 @@
+import logging
 from langchain_huggingface import HuggingFaceEmbeddings
 
+from app.core.config import settings
+from app.core.embedding_cache import CachedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Bump when the model or its settings change so cached vectors are not reused
+EMBEDDING_CACHE_VERSION = "v2"
+
+# Passed to SentenceTransformer.encode: unit-length vectors (so L2/cosine ranking reduces to a
+# dot product) and 64 texts per forward pass for wider GEMMs than the default of 32
+ENCODE_KWARGS = {"normalize_embeddings": True, "batch_size": 64}
+
 def get_embedding_function():
     """Gets the embedding model from Hugging Face."""
-    print("Loading embedding model (if not already loaded)...")
+    logger.info("Loading embedding model (if not already loaded)...")
     # small, fast, and effective open-source model
-    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    if not settings.EMBEDDING_ONNX_FILE:
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, encode_kwargs=ENCODE_KWARGS)
+    # Quantized int8 ONNX graph: fused kernels and int8 GEMMs, a fraction of the FP32 torch cost
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={
+            "backend": "onnx",
+            "model_kwargs": {"file_name": settings.EMBEDDING_ONNX_FILE}
+        },
+        encode_kwargs=ENCODE_KWARGS
+    )
+
+def _embedding_cache_model_key() -> str:
+    # Vectors from the torch model and each ONNX export differ slightly; keep them apart
+    backend = settings.EMBEDDING_ONNX_FILE or "torch"
+    return f"{EMBEDDING_MODEL_NAME}@{EMBEDDING_CACHE_VERSION}:{backend}"
+
+# Identifies the vector space chunks are embedded in (also part of every Chroma chunk ID)
+EMBEDDING_MODEL_KEY = _embedding_cache_model_key()
+
+embedding_function_instance = CachedEmbeddings(
+    get_embedding_function(),
+    provider="huggingface",
+    model=EMBEDDING_MODEL_KEY,
+    db_path=settings.EMBEDDING_CACHE_PATH
+)
 
-embedding_function_instance = get_embedding_function()
\ No newline at end of file
+# Run one encode at import so the first user request sees steady-state latency
+# (torch kernels, tokenizer and threadpools initialize on the first call). This goes to the
+# underlying model directly: through the cache it would be a no-op after the first run.
+try:
+    embedding_function_instance.underlying.embed_query("warmup")
+except Exception as e:
+    logger.warning("Embedding model warm-up failed (will initialize on first use): %s", e)
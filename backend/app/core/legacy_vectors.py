@@ -0,0 +1,114 @@
+# backend/app/core/legacy_vectors.py
+
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.vector_db import get_chroma_client, get_chroma_collection_object
+
+logger = logging.getLogger(__name__)
+
+# Before per-user collections, every user's chunks lived in this one collection,
+# tagged with a "user_id" (string) metadata field.
+LEGACY_COLLECTION_NAME = "user_documents"
+
+def get_legacy_collection():
+    """Returns the shared pre-per-user collection, or None if it no longer exists."""
+    client = get_chroma_client()
+    # list_collections returns names on newer Chroma versions, Collection objects on older ones
+    names = {getattr(collection, "name", collection) for collection in client.list_collections()}
+    if LEGACY_COLLECTION_NAME not in names:
+        return None
+    return client.get_collection(name=LEGACY_COLLECTION_NAME)
+
+def migrate_user(db: Session, legacy_collection, user_id: int) -> int:
+    """
+    Moves one user's chunks from the legacy collection into their own collection and
+    records their IDs in document_chunks, so delete-by-ID and re-ingest cleanup cover them.
+    Chunks of files with no Document row (not listed, not deletable) are dropped.
+    Returns the number of chunks moved.
+    """
+    rows = legacy_collection.get(
+        where={"user_id": str(user_id)},
+        include=["embeddings", "documents", "metadatas"]
+    )
+    if not rows["ids"]:
+        return 0
+
+    document_ids = dict(db.execute(
+        select(models.Document.original_filename, models.Document.id)
+        .where(models.Document.owner_id == user_id)
+    ).all())
+
+    keep = [
+        i for i, metadata in enumerate(rows["metadatas"])
+        if (metadata or {}).get("source_filename") in document_ids
+    ]
+    if keep:
+        target = get_chroma_collection_object(user_id)
+        max_batch = get_chroma_client().get_max_batch_size()
+        for start in range(0, len(keep), max_batch):
+            batch = keep[start:start + max_batch]
+            target.upsert(
+                ids=[rows["ids"][i] for i in batch],
+                embeddings=[rows["embeddings"][i] for i in batch],
+                documents=[rows["documents"][i] for i in batch],
+                # Same metadata as current chunks: the collection already scopes them to the user
+                metadatas=[{"source_filename": rows["metadatas"][i]["source_filename"]} for i in batch]
+            )
+        db.execute(
+            pg_insert(models.DocumentChunk).on_conflict_do_nothing(index_elements=["id"]),
+            [
+                {
+                    "id": rows["ids"][i],
+                    "document_id": document_ids[rows["metadatas"][i]["source_filename"]],
+                    "owner_id": user_id
+                }
+                for i in keep
+            ]
+        )
+        db.commit()
+
+    # Only removed from the legacy collection once copied and recorded
+    legacy_collection.delete(ids=rows["ids"])
+    return len(keep)
+
+def migrate_legacy_collection() -> None:
+    """
+    One-shot migration of the shared legacy collection into per-user collections; the
+    legacy collection is deleted once empty, so later startups only do a name lookup.
+    Idempotent: an interrupted run resumes with the users not yet moved.
+    """
+    legacy_collection = get_legacy_collection()
+    if legacy_collection is None:
+        return
+
+    db = SessionLocal()
+    try:
+        owner_ids = db.scalars(select(models.Document.owner_id).distinct()).all()
+        for user_id in owner_ids:
+            moved = migrate_user(db, legacy_collection, user_id)
+            if moved:
+                logger.info("Migrated %d legacy chunks into the collection of user %s", moved, user_id)
+    finally:
+        db.close()
+
+    remaining = legacy_collection.count()
+    if remaining:
+        # Chunks of users with no documents left; nothing can list or delete them
+        logger.warning("Dropping %d orphaned chunks with the legacy collection", remaining)
+    get_chroma_client().delete_collection(name=LEGACY_COLLECTION_NAME)
+    logger.info("Legacy collection '%s' migrated and removed.", LEGACY_COLLECTION_NAME)
+
+def delete_legacy_chunks(user_id: int, filename: str) -> None:
+    """Deletes a file's chunks from the legacy collection, if it still exists (untracked chunks)."""
+    legacy_collection = get_legacy_collection()
+    if legacy_collection is None:
+        return
+    legacy_collection.delete(
+        where={"$and": [{"user_id": str(user_id)}, {"source_filename": filename}]}
+    )
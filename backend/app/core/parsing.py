@@ -0,0 +1,114 @@
+# backend/app/core/parsing.py
+
+import csv
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from langchain_community.document_loaders import PyPDFium2Loader, Docx2txtLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+## Document Loading & Chunking
+# =============================
+
+def load_document(file_path: str):
+    """
+    Loads a document (PDF, DOCX, CSV) from the given file path.
+    Returns a lazy iterator of pages, so a large PDF is never fully resident at once.
+    """
+    logger.debug("Loading document from: %s", file_path)
+    _, ext = os.path.splitext(file_path)
+    ext = ext.lower()
+
+    if ext == ".pdf":
+        loader = PyPDFium2Loader(file_path) # Native pdfium text extraction (vs pure-Python pypdf)
+    elif ext == ".docx":
+        loader = Docx2txtLoader(file_path)
+    elif ext == ".csv":
+        return [_load_csv(file_path)]
+    else:
+        # Raise error for unsupported types
+        raise ValueError(f"Unsupported file type: {ext}")
+    return loader.lazy_load()
+
+def _load_csv(file_path: str) -> Document:
+    """
+    Reads a whole CSV into one Document, a "column: value" line per cell and a blank line
+    between rows (the same text CSVLoader produced per row). The splitter then chunks the
+    file once, preferring row boundaries, instead of handling one tiny Document per row.
+    """
+    rows = []
+    with open(file_path, newline="", encoding="utf-8") as csv_file: # Specify encoding for CSV
+        for row in csv.DictReader(csv_file):
+            rows.append("\n".join(f"{column}: {value}" for column, value in row.items()))
+    return Document(page_content="\n\n".join(rows), metadata={"source": file_path})
+
+def chunk_document(pages, chunk_size=1000, chunk_overlap=200):
+    """
+    Splits loaded document pages (any iterable) into smaller, overlapping chunks.
+    Using RecursiveCharacterTextSplitter by default.
+    Consider experimenting with chunk_size and chunk_overlap for optimal retrieval.
+    """
+    logger.debug("Chunking document with size=%d, overlap=%d...", chunk_size, chunk_overlap)
+    splitter = _get_splitter(chunk_size, chunk_overlap)
+    # Page at a time: each page is dropped once split, only the chunks accumulate
+    chunks = []
+    for page in pages:
+        chunks.extend(splitter.split_documents([page]))
+    return chunks
+
+@lru_cache(maxsize=8)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    # Splitters are stateless between calls, so one instance per configuration is reused
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        is_separator_regex=False, # Use default separators like "\n\n", "\n", " ", ""
+    )
+
+def load_and_chunk(file_path: str):
+    """
+    Loads and chunks a file in one call. Top-level so it can run in the parse pool;
+    only the chunks (not the full pages) are sent back to the parent process.
+    """
+    return chunk_document(load_document(file_path))
+
+## Parse Process Pool
+# ====================
+# PDF text extraction is native pdfium code, but the rest of a parse still holds the GIL:
+# the DOCX and CSV loaders, per-page Document construction and the recursive text
+# splitter are Python, and for large files they are a significant share of the work.
+# Separate processes also isolate the server from a native crash or runaway memory in
+# a parser on a malformed file (a worker dies, not the app).
+# Workers are spawned (not forked from a process that already runs threads) and
+# only import this module's dependencies.
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Returns the shared parse pool, starting it on first use."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=settings.PARSE_WORKERS or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+def shutdown_parse_pool() -> None:
+    """Stops the parse pool's worker processes (app shutdown)."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
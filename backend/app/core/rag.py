@@ -1,140 +1,137 @@
 # backend/app/core/rag.py
 
-import os
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, CSVLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import hashlib
+import logging
+import threading
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from langchain_chroma import Chroma # LangChain's Chroma wrapper
-import uuid # For generating IDs when adding to collection
 
 # Import ChromaDB client/name and embedding function instance
 from app.vector_db import get_chroma_client, get_chroma_collection_name
-from app.core.embeddings import embedding_function_instance # Import the instance
+from app.core.embeddings import embedding_function_instance, EMBEDDING_MODEL_KEY # Import the instance
 # Import centralized settings
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 ## Document Loading & Chunking
 # =============================
-
-def load_document(file_path: str):
-    """
-    Loads a document (PDF, DOCX, CSV) from the given file path.
-    """
-    print(f"Loading document from: {file_path}")
-    _, ext = os.path.splitext(file_path)
-    ext = ext.lower()
-
-    if ext == ".pdf":
-        loader = PyPDFLoader(file_path)
-    elif ext == ".docx":
-        loader = Docx2txtLoader(file_path)
-    elif ext == ".csv":
-        loader = CSVLoader(file_path, encoding="utf-8") # Specify encoding for CSV
-    else:
-        # Raise error for unsupported types
-        raise ValueError(f"Unsupported file type: {ext}")
-    return loader.load()
-
-def chunk_document(pages, chunk_size=1000, chunk_overlap=200):
-    """
-    Splits loaded document pages into smaller, overlapping chunks.
-    Using RecursiveCharacterTextSplitter by default.
-    Consider experimenting with chunk_size and chunk_overlap for optimal retrieval.
-    """
-    print(f"Chunking document with size={chunk_size}, overlap={chunk_overlap}...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        is_separator_regex=False, # Use default separators like "\n\n", "\n", " ", ""
-    )
-    return text_splitter.split_documents(pages)
+# Implemented in core/parsing.py (a light module that process-pool workers can import
+# without loading the embedding model); re-exported here for existing callers.
+from app.core.parsing import load_document, chunk_document, load_and_chunk
 
 ## Vector Store Interaction (ChromaDB)
 # ====================================
 
+def chunk_id(user_id: int, source_filename: str, content: str) -> str:
+    """
+    Deterministic Chroma ID for a chunk: same embedding model, user, file and text always
+    give the same ID. The model key is part of it so that after a model/backend change,
+    re-ingested chunks are re-embedded instead of keeping vectors from the old model.
+    """
+    return hashlib.blake2b(
+        f"{EMBEDDING_MODEL_KEY}|{user_id}|{source_filename}|{content}".encode("utf-8"), digest_size=16
+    ).hexdigest()
+
 def add_documents_to_chroma(chunks, user_id: int, source_filename: str):
     """
-    Adds document chunks to the persistent ChromaDB collection
-    using the low-level client. Ensures user_id is stored as a string.
+    Adds document chunks to the user's persistent ChromaDB collection
+    using the low-level client. Returns the chunk IDs of the file.
+
+    IDs are content hashes, so re-ingesting a file only embeds and writes the chunks
+    whose text changed; unchanged chunks are already stored under the same ID.
     """
-    print(f"Adding {len(chunks)} chunks to ChromaDB for user {user_id} from {source_filename} via low-level client...")
+    return add_documents_to_chroma_batch([(chunks, source_filename)], user_id)[0]
 
+def add_documents_to_chroma_batch(files, user_id: int):
+    """
+    Adds the chunks of several files to the user's ChromaDB collection in one write.
+
+    Args:
+        files: List of (chunks, source_filename) pairs.
+        user_id: Owner of the files (selects the collection).
+
+    Returns:
+        One list of (distinct) chunk IDs per input file, in the same order.
+    """
     # Import here if needed to avoid potential top-level circular imports during init
     from app.vector_db import get_chroma_collection_object
-    chroma_collection = get_chroma_collection_object()
-
-    # Prepare metadata list, ensuring user_id is a string
-    metadatas = [
-        {"user_id": str(user_id), "source_filename": source_filename}
-        for _ in chunks
-    ]
-
-    # Extract page content from Langchain Document objects
-    documents = [chunk.page_content for chunk in chunks]
-
-    # Generate unique IDs for each chunk (required by ChromaDB .add)
-    ids = [str(uuid.uuid4()) for _ in chunks]
-
-    # Add data directly to the ChromaDB collection object
-    # The collection handles embedding internally using the function it was initialized with.
-    print(f"Calling chroma_collection.add() with {len(documents)} documents...")
-    chroma_collection.add(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
-    print("Chunks added successfully using low-level collection.add().")
+    chroma_collection = get_chroma_collection_object(user_id)
+
+    # Distinct chunks across the batch: id -> (text, metadata)
+    new_chunks = {}
+    ids_per_file = []
+    for chunks, source_filename in files:
+        file_ids = []
+        for chunk in chunks:
+            cid = chunk_id(user_id, source_filename, chunk.page_content)
+            if cid in new_chunks:
+                continue # Repeated text within the file (boilerplate, headers): store once
+            # Metadata only needs the filename (the collection itself scopes chunks to the user)
+            new_chunks[cid] = (chunk.page_content, {"source_filename": source_filename})
+            file_ids.append(cid)
+        ids_per_file.append(file_ids)
+
+    # Chunks already in the collection are unchanged content: skip embedding and writing them
+    max_batch = get_chroma_client().get_max_batch_size()
+    all_ids = list(new_chunks)
+    for start in range(0, len(all_ids), max_batch):
+        for existing_id in chroma_collection.get(ids=all_ids[start:start + max_batch], include=[])["ids"]:
+            new_chunks.pop(existing_id, None)
+
+    logger.info("Adding %d new of %d chunks from %d file(s) to ChromaDB for user %s via low-level client...", len(new_chunks), len(all_ids), len(files), user_id)
+    if not new_chunks:
+        return ids_per_file
+
+    ids = list(new_chunks)
+    documents = [text for text, _ in new_chunks.values()]
+    metadatas = [metadata for _, metadata in new_chunks.values()]
+
+    # Embed all new chunks in one embed_documents call (batched internally) through the shared
+    # cached instance
+    embeddings = embedding_function_instance.embed_documents(documents)
+
+    # Add data directly to the ChromaDB collection object: one upsert for the whole batch,
+    # split only where it exceeds the largest batch the Chroma backend accepts
+    logger.debug("Calling chroma_collection.upsert() with %d documents...", len(documents))
+    for start in range(0, len(ids), max_batch):
+        end = start + max_batch
+        chroma_collection.upsert(
+            documents=documents[start:end],
+            embeddings=embeddings[start:end],
+            metadatas=metadatas[start:end],
+            ids=ids[start:end]
+        )
+    logger.debug("Chunks added successfully using low-level collection.upsert().")
+    return ids_per_file
+
+def delete_chunks_from_chroma(user_id: int, ids: list[str]):
+    """
+    Deletes chunks from the user's ChromaDB collection by ID (no metadata scan).
+    """
+    if not ids:
+        return
+    from app.vector_db import get_chroma_collection_object
+    get_chroma_collection_object(user_id).delete(ids=ids)
 
 ## RAG Chain Creation
 # ====================
 
-def create_qa_chain(user_id: int):
+def format_docs(docs) -> str:
     """
-    Creates the complete RAG Question-Answering chain using LCEL.
-    1. Initializes the LLM (Gemini).
-    2. Initializes the Chroma vector store wrapper for retrieval.
-    3. Creates a retriever filtered specifically for the given user_id.
-    4. Defines a strict prompt template enforcing context-based answers.
-    5. Assembles the chain using LangChain Expression Language (LCEL).
+    Renders retrieved chunks as the prompt's Context block.
+    Only page content is included (no Document reprs/metadata), and chunks are put in a
+    canonical order so the same retrieval set always yields an identical prompt prefix.
     """
-    print(f"Creating Q&A chain for user {user_id}...") # Log the user ID
+    ordered = sorted(docs, key=lambda doc: (doc.metadata.get("source_filename", ""), doc.page_content))
+    return "\n\n".join(doc.page_content for doc in ordered)
 
-    # 1. Initialize the LLM
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-pro-latest", # Or consider "gemini-1.5-flash-latest"
-        google_api_key=settings.GOOGLE_API_KEY,
-        convert_system_message_to_human=True, # Helps with compatibility
-        temperature=0.1 # Lower temperature for more factual, less creative answers
-    )
-
-    # 2. Initialize LangChain Chroma wrapper (needed for the retriever interface)
-    vector_store = Chroma(
-        client=get_chroma_client(),
-        collection_name=get_chroma_collection_name(),
-        embedding_function=embedding_function_instance, # Use the shared instance
-        persist_directory=settings.VECTOR_STORE_DIR # Should match client init path
-    )
-
-    # 3. Create the retriever with user filtering and increased k
-    user_filter = {'user_id': str(user_id)} # Ensure user_id is string
-    retrieved_chunk_count = 8 # Number of chunks to retrieve
-    print(f"Applying retriever filter: {user_filter}, retrieving top {retrieved_chunk_count} chunks.")
-
-    retriever = vector_store.as_retriever(
-        search_kwargs={
-            'filter': user_filter,
-            'k': retrieved_chunk_count # Retrieve more chunks for better context
-        }
-        # Consider adding different search types if needed:
-        # search_type="mmr" # Max Marginal Relevance for diverse results
-    )
-
-    # 4. Define the strict prompt template
-    template = """
+# Strict prompt template enforcing context-based answers. The text never changes, so it
+# is parsed into a PromptTemplate once at import rather than per chain built.
+QA_PROMPT_TEMPLATE = """
     **Instructions:**
     1. You are an assistant specialized in answering questions based *solely* on the provided document excerpts (Context).
     2. Carefully examine the Context provided below.
@@ -151,17 +148,89 @@ def create_qa_chain(user_id: int):
 
     **Answer:**
     """
-    prompt = PromptTemplate.from_template(template)
+QA_PROMPT = PromptTemplate.from_template(QA_PROMPT_TEMPLATE)
+
+def create_qa_chain(user_id: int):
+    """
+    Creates the complete RAG Question-Answering chain using LCEL.
+    1. Initializes the LLM (Gemini).
+    2. Resolves the user's own Chroma collection.
+    3. Creates a retriever that queries that collection directly.
+    4. Uses the strict QA_PROMPT template enforcing context-based answers.
+    5. Assembles the chain using LangChain Expression Language (LCEL).
+    """
+    logger.info("Creating Q&A chain for user %s...", user_id) # Log the user ID
+
+    # 1. Initialize the LLM
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-pro-latest", # Or consider "gemini-1.5-flash-latest"
+        google_api_key=settings.GOOGLE_API_KEY,
+        convert_system_message_to_human=True, # Helps with compatibility
+        temperature=0.1 # Lower temperature for more factual, less creative answers
+    )
+
+    # 2. Resolve the low-level collection once per chain (no LangChain vector store wrapper)
+    from app.vector_db import get_chroma_collection_object
+    chroma_collection = get_chroma_collection_object(user_id)
+
+    # 3. Create the retriever with increased k
+    # No metadata filter: the collection only holds this user's chunks
+    retrieved_chunk_count = 8 # Number of chunks to retrieve
+    logger.debug("Retrieving top %d chunks from %s.", retrieved_chunk_count, get_chroma_collection_name(user_id))
+
+    def retrieve(question: str):
+        # The collection has no embedding function of its own, so embed here. /query has
+        # usually just embedded the same text for its cache lookup, so this is an LRU hit.
+        query_embedding = embedding_function_instance.embed_query(question)
+        result = chroma_collection.query(
+            query_embeddings=[query_embedding],
+            n_results=retrieved_chunk_count, # Retrieve more chunks for better context
+            include=["documents", "metadatas"]
+        )
+        return [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(result["documents"][0], result["metadatas"][0])
+        ]
+
+    # Sync function: under ainvoke/astream LCEL runs it in an executor thread, so the
+    # embedding and Chroma query never block the event loop
+    retriever = RunnableLambda(retrieve)
+
+    # 4. The strict prompt template is constant, so it is parsed once at import (QA_PROMPT)
 
     # 5. Define the LCEL Chain structure
     # RunnablePassthrough takes the initial input (query string) and passes it along.
     # The dictionary maps 'context' and 'question' for the prompt.
     chain = (
-        {"context": retriever, "question": RunnablePassthrough()}
-        | prompt
+        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+        | QA_PROMPT
         | llm
         | StrOutputParser() # Parses the LLM's message content into a string
     )
 
-    print("Q&A chain created successfully.")
-    return chain
\ No newline at end of file
+    logger.debug("Q&A chain created successfully.")
+    return chain
+
+# Built chains keyed by user_id. A chain holds no per-query state (the retriever queries
+# the user's collection on every call), so one instance per user can serve every /query.
+_qa_chain_cache: dict[int, object] = {}
+_qa_chain_cache_lock = threading.Lock()
+
+def get_qa_chain(user_id: int):
+    """
+    Returns the cached Q&A chain for a user, building it on first use.
+    """
+    with _qa_chain_cache_lock:
+        chain = _qa_chain_cache.get(user_id)
+    if chain is not None:
+        return chain
+
+    chain = create_qa_chain(user_id=user_id)
+    with _qa_chain_cache_lock:
+        # Another request may have built one concurrently; keep whichever landed first
+        return _qa_chain_cache.setdefault(user_id, chain)
+
+def invalidate_qa_chain(user_id: int) -> None:
+    """Drops a user's cached chain so the next query rebuilds it, e.g. after their documents change."""
+    with _qa_chain_cache_lock:
+        _qa_chain_cache.pop(user_id, None)
@@ -1,37 +1,74 @@
-from datetime import datetime, timedelta, timezone
-from jose import JWTError, jwt
+from datetime import timedelta
+import jwt # PyJWT
 from app.core.config import settings
 from app.schemas import TokenData
 from typing import Optional
-import bcrypt 
+from functools import lru_cache
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import bcrypt # Verifies legacy hashes only
 import secrets
+import time
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifies a plain password against a hashed one."""
-    return bcrypt.checkpw(
-        plain_password.encode('utf-8'), 
-        hashed_password.encode('utf-8')
-    )
+# Password hashing: argon2id (memory-hard). Parameters come from settings and are encoded
+# in every hash, so retuning them only affects new hashes (old ones rehash on next login).
+_password_hasher = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST_KIB,
+    parallelism=settings.ARGON2_PARALLELISM
+)
+
+def _is_bcrypt_hash(hashed_password: str) -> bool:
+    # Accounts created before the switch to argon2id still hold bcrypt hashes ($2a$/$2b$/$2y$)
+    return hashed_password.startswith("$2")
+
+@lru_cache(maxsize=1)
+def _dummy_password_hash() -> str:
+    # Hash of a random password at the configured cost, computed on first use
+    return _password_hasher.hash(secrets.token_urlsafe(16))
+
+def verify_password(plain_password: str, hashed_password: Optional[str]) -> bool:
+    """
+    Verifies a plain password against a hashed one (argon2id, or legacy bcrypt).
+    Pass None when no user matched: a dummy hash is still checked (and False returned),
+    so an unknown email costs the same hashing time as a wrong password.
+    """
+    if hashed_password is None:
+        try:
+            _password_hasher.verify(_dummy_password_hash(), plain_password)
+        except VerificationError:
+            pass
+        return False
+    if _is_bcrypt_hash(hashed_password):
+        try:
+            return bcrypt.checkpw(
+                plain_password.encode('utf-8'), 
+                hashed_password.encode('utf-8')
+            )
+        except ValueError: # e.g. passwords over bcrypt's 72-byte limit
+            return False
+    try:
+        return _password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True for legacy bcrypt hashes and argon2 hashes made with outdated parameters."""
+    return _is_bcrypt_hash(hashed_password) or _password_hasher.check_needs_rehash(hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hashes a plain password."""
-    # Hash the password and decode 
-    hashed_bytes = bcrypt.hashpw(
-        password.encode('utf-8'), 
-        bcrypt.gensalt()
-    )
-    return hashed_bytes.decode('utf-8')
+    """Hashes a plain password with argon2id (no input length limit, unlike bcrypt)."""
+    return _password_hasher.hash(password)
 
 # JWT Token Handling
 
+_DEFAULT_TOKEN_TTL_SECONDS = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    to_encode.update({"exp": expire})
+    # `exp` as integer epoch seconds (what the JWT carries anyway); no datetime round trip
+    ttl_seconds = int(expires_delta.total_seconds()) if expires_delta else _DEFAULT_TOKEN_TTL_SECONDS
+    to_encode["exp"] = int(time.time()) + ttl_seconds
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -41,9 +78,10 @@ def decode_access_token(token: str) -> Optional[TokenData]:
         email: str = payload.get("sub")
         if email is None:
             return None
-        return TokenData(email=email)
-    except JWTError:
+        # The payload is signature-verified and we minted it, so skip field validation
+        return TokenData.model_construct(email=email)
+    except jwt.PyJWTError:
         return None
     
 def create_password_reset_token() -> str:
-    return secrets.token_urlsafe(32)
\ No newline at end of file
+    return secrets.token_urlsafe(32)
@@ -0,0 +1,174 @@
+# backend/app/core/semantic_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.core.config import settings
+
+# Unit-vector components in [-1, 1] map onto int8 [-127, 127]
+_INT8_SCALE = 127.0
+
+
+class ProximityCache:
+    """
+    Approximate query -> answer cache keyed on query embeddings.
+
+    A lookup is a hit when a stored query vector lies within cosine distance
+    `tau` of the incoming one, so near-duplicate questions skip retrieval and
+    LLM generation entirely. Entries are evicted least-recently-used once
+    `capacity` is reached, and expire `ttl` seconds after being stored.
+
+    Stored vectors are int8 scalar-quantized (unit vectors scaled by 127), a 4x
+    memory and bandwidth cut versus float32 with negligible effect at tau-level
+    distances.
+    """
+
+    def __init__(self, capacity: int, tau: float, ttl: float):
+        self.capacity = capacity
+        self.tau = tau
+        self.ttl = ttl
+        self._vectors = None # (capacity, dim) int8 matrix of quantized, L2-normalized query vectors
+        self._answers = [None] * capacity
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._lru = OrderedDict() # slot index -> None, oldest first
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    @staticmethod
+    def _quantize(unit_vector: np.ndarray) -> np.ndarray:
+        return np.clip(np.round(unit_vector * _INT8_SCALE), -_INT8_SCALE, _INT8_SCALE).astype(np.int8)
+
+    def lookup(self, vector):
+        """Returns the cached answer closest to `vector`, or None if none is within tau."""
+        with self._lock:
+            if not self._lru:
+                return None
+            query = self._normalize(vector)
+            slots = np.fromiter(self._lru.keys(), dtype=np.intp, count=len(self._lru))
+            similarities = (self._vectors[slots] @ query) / _INT8_SCALE
+            similarities[self._expires_at[slots] < time.monotonic()] = -np.inf
+            best = int(np.argmax(similarities))
+            if 1.0 - float(similarities[best]) > self.tau:
+                return None
+            slot = int(slots[best])
+            self._lru.move_to_end(slot)
+            return self._answers[slot]
+
+    def put(self, vector, answer) -> None:
+        """Stores `answer` under `vector`, evicting the least recently used entry if full."""
+        with self._lock:
+            query = self._normalize(vector)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, query.shape[0]), dtype=np.int8)
+            if len(self._lru) < self.capacity:
+                slot = len(self._lru)
+            else:
+                slot, _ = self._lru.popitem(last=False)
+            self._vectors[slot] = self._quantize(query)
+            self._answers[slot] = answer
+            self._expires_at[slot] = time.monotonic() + self.ttl
+            self._lru[slot] = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self._answers = [None] * self.capacity
+
+
+class ExactCache:
+    """
+    Exact-match tier: sha256 of the normalized query -> answer, LRU with a TTL.
+    Checked before the query is embedded, so repeated questions cost a dict lookup.
+    """
+
+    def __init__(self, capacity: int, ttl: float):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict() # digest -> (answer, expires_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str) -> bytes:
+        return hashlib.sha256(normalize_query(query).encode("utf-8")).digest()
+
+    def get(self, query: str):
+        digest = self.key(query)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            answer, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return answer
+
+    def put(self, query: str, answer) -> None:
+        digest = self.key(query)
+        with self._lock:
+            self._entries[digest] = (answer, time.monotonic() + self.ttl)
+            self._entries.move_to_end(digest)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form used for exact matching: case- and surrounding-whitespace-insensitive."""
+    return " ".join(query.lower().split())
+
+
+class _UserCache:
+    def __init__(self):
+        self.exact = ExactCache(
+            capacity=settings.SEMANTIC_CACHE_CAPACITY,
+            ttl=settings.SEMANTIC_CACHE_TTL_SECONDS
+        )
+        self.semantic = ProximityCache(
+            capacity=settings.SEMANTIC_CACHE_CAPACITY,
+            tau=settings.SEMANTIC_CACHE_TAU,
+            ttl=settings.SEMANTIC_CACHE_TTL_SECONDS
+        )
+
+
+# One cache per user: answers depend on that user's documents only.
+_user_caches: dict[int, _UserCache] = {}
+_user_caches_lock = threading.Lock()
+
+def _get_user_cache(user_id: int) -> _UserCache:
+    with _user_caches_lock:
+        cache = _user_caches.get(user_id)
+        if cache is None:
+            cache = _UserCache()
+            _user_caches[user_id] = cache
+        return cache
+
+def get_exact_answer(user_id: int, query: str):
+    """Returns the cached answer for this exact (normalized) query by this user, or None."""
+    return _get_user_cache(user_id).exact.get(query)
+
+def get_cached_answer(user_id: int, query_vector):
+    """Returns a cached answer for a near-duplicate query by this user, or None."""
+    return _get_user_cache(user_id).semantic.lookup(query_vector)
+
+def store_answer(user_id: int, query: str, query_vector, answer: str) -> None:
+    """Caches the answer generated for this user's query in both tiers."""
+    cache = _get_user_cache(user_id)
+    cache.exact.put(query, answer)
+    cache.semantic.put(query_vector, answer)
+
+def invalidate_user(user_id: int) -> None:
+    """Drops all cached answers for a user, e.g. after their documents change."""
+    with _user_caches_lock:
+        cache = _user_caches.pop(user_id, None)
+    if cache is not None:
+        cache.semantic.clear()
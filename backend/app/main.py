@@ -1,29 +1,82 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import Response
 from contextlib import asynccontextmanager
+import asyncio
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
-from fastapi.middleware.cors import CORSMiddleware
+from app.core.cors import FastCORS
 
 from app.api.auth import router as auth_router
 from app.api.routes import router as rag_router
 from app.database import engine, Base 
+from app.core.parsing import shutdown_parse_pool
+from app.core.legacy_vectors import migrate_legacy_collection
+from app.core.config import settings
 
-# Create all database tables 
-Base.metadata.create_all(bind=engine)
+def configure_logging() -> QueueListener:
+    """
+    Configures root logging once for the app. Request threads only enqueue records;
+    a background QueueListener thread does the actual stream I/O.
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(settings.LOG_LEVEL.upper()) # Records below this are dropped before formatting
+    root_logger.addHandler(QueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+log_listener = configure_logging()
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Application startup...")
+    logger.info("Application startup...")
+    if settings.AUTO_MIGRATE:
+        # Create missing database tables: off the event loop, and only when enabled
+        # (every worker would otherwise repeat the same DDL checks at startup)
+        await asyncio.to_thread(Base.metadata.create_all, bind=engine)
+    # Move chunks from the pre-per-user shared collection, if any remain (no-op afterwards)
+    await asyncio.to_thread(migrate_legacy_collection)
     yield
     # Code to run on shutdown
-    print("Application shutdown...")
+    logger.info("Application shutdown...")
+    shutdown_parse_pool() # Stop document-parsing worker processes
+    log_listener.stop() # Flush queued log records
 
 app = FastAPI(
     title="QueryPrism API",
     description="A stateless RAG API with PostgreSQL and user authentication.",
     version="4.0.0",
-    lifespan=lifespan 
+    lifespan=lifespan,
+    # orjson for every route's JSON response (RAG routes, the root), not just the auth router;
+    # error responses are covered by the handlers below
+    default_response_class=ORJSONResponse
 )
 
+# FastAPI's default HTTPException / validation handlers build stdlib JSONResponse objects
+# explicitly; these produce the same bodies and status codes through orjson.
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    headers = getattr(exc, "headers", None)
+    if exc.status_code < 200 or exc.status_code in (204, 205, 304):
+        return Response(status_code=exc.status_code, headers=headers) # No body allowed
+    return ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=headers)
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    return ORJSONResponse({"detail": jsonable_encoder(exc.errors())}, status_code=422)
+
 # MIDDLEWARE 
 origins = [
     "http://localhost:5173",  
@@ -31,13 +84,11 @@ origins = [
     "http://localhost",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,       
-    allow_credentials=True,      
-    allow_methods=["*"],         
-    allow_headers=["*"],       
-)
+# Allowed origins as header bytes, built once at import and kept on app.state
+app.state.cors_origins = frozenset(origin.encode("ascii") for origin in origins)
+# Pure-ASGI CORS (any method/header, credentials allowed, same as the previous
+# CORSMiddleware setup) without per-request Request/Headers objects
+app.add_middleware(FastCORS, allowed_origins=app.state.cors_origins)
 
 
 
@@ -1,9 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, UniqueConstraint, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
 
-from datetime import datetime, timedelta
-
 class User(Base):
 
     __tablename__ = "users"
@@ -25,11 +24,55 @@ class User(Base):
 
     documents = relationship("Document", back_populates="owner")
 
+    __table_args__ = (
+        # Case-insensitive email uniqueness, and the index login lookups on lower(email) use
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+    )
+
 
 class Document(Base):
     __tablename__ = "documents"
     id = Column(Integer, primary_key=True, index=True)
     original_filename = Column(String, nullable=False, index=True) 
-    uploaded_at = Column(DateTime, default=datetime.utcnow) # This is naive, might change later if needed
+    uploaded_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False) # Set by Postgres (timestamptz)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    owner = relationship("User", back_populates="documents")
\ No newline at end of file
+    owner = relationship("User", back_populates="documents")
+
+    # Drive source version for synced files (NULL for direct uploads); unchanged files are skipped on sync
+    md5_checksum = Column(String, nullable=True)
+    modified_time = Column(DateTime(timezone=True), nullable=True)
+    # Embedding model key the chunks were embedded with; a mismatch forces a Drive re-sync
+    embedding_model = Column(String, nullable=True)
+
+    __table_args__ = (
+        # One row per (user, filename); also the conflict target for upserts and serves deletes
+        UniqueConstraint("owner_id", "original_filename", name="uq_doc_owner_filename"),
+        # list_documents: owner's files newest-first, as an index-only scan (PG 11+ INCLUDE)
+        Index(
+            "ix_doc_owner_uploaded",
+            owner_id,
+            uploaded_at.desc(),
+            postgresql_include=["original_filename"]
+        ),
+    )
+
+class DocumentChunk(Base):
+    """Chroma IDs of a document's chunks, so vectors can be deleted by ID instead of a `where` scan."""
+    __tablename__ = "document_chunks"
+    id = Column(String, primary_key=True) # Chroma ID: blake2b of user id, filename and chunk text
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+class SyncJob(Base):
+    """
+    Latest background Drive sync per user. Kept in PostgreSQL rather than process memory
+    so every worker sees the same job (status polls may hit a different worker).
+    """
+    __tablename__ = "sync_jobs"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String, nullable=False) # "queued", "running", "success", "skipped" or "failed"
+    message = Column(Text, nullable=True)
+    processed_count = Column(Integer, nullable=True)
+    unchanged_count = Column(Integer, nullable=True)
+    failed_files = Column(JSONB, nullable=True) # List of "<name> (<reason>)" strings
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
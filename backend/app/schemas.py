@@ -1,7 +1,13 @@
 # backend/app/schemas.py
 
-from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import Optional
+from pydantic import AfterValidator, BaseModel, ConfigDict, EmailStr, Field
+from typing import Annotated, Optional
+
+# Response-only payloads are never modified after construction
+RESPONSE_CONFIG = ConfigDict(frozen=True)
+
+# Emails are stored and matched lower-cased (see ix_users_email_lower on users)
+NormalizedEmail = Annotated[EmailStr, AfterValidator(str.lower)]
 
 # --- Document Schemas ---
 
@@ -12,11 +18,13 @@ class QueryRequest(BaseModel):
 
 class UploadResponse(BaseModel):
     """Response schema after uploading a document."""
+    model_config = RESPONSE_CONFIG
     document_id: str # Represents processed file, e.g., "processed_filename.pdf"
     message: str
 
 class QueryResponse(BaseModel):
     """Response schema for a RAG query."""
+    model_config = RESPONSE_CONFIG
     answer: str
 
 class UserQueryRequest(BaseModel):
@@ -27,33 +35,23 @@ class UserQueryRequest(BaseModel):
 
 class UserBase(BaseModel):
     """Base schema for user, containing email."""
-    email: EmailStr
+    email: NormalizedEmail
 
 class UserCreate(UserBase):
     """Schema for creating a new user."""
     full_name: str
     password: str = Field(..., min_length=8) # Ensure minimum length
 
-    @field_validator('password')
-    @classmethod
-    def validate_password_bcrypt(cls, v: str) -> str:
-        """Validate password byte length for bcrypt compatibility."""
-        byte_length = len(v.encode('utf-8'))
-        if byte_length > 72:
-            raise ValueError(f'Password exceeds maximum 72 bytes ({byte_length} bytes found).')
-        return v
-
 class User(UserBase):
     """Schema representing a user in API responses."""
+    model_config = ConfigDict(from_attributes=True) # Enable ORM mode compatibility
     id: int
     full_name: str
     is_active: bool
 
-    class Config:
-        from_attributes = True # Enable ORM mode compatibility
-
 class Token(BaseModel):
     """Schema for the JWT access token response."""
+    model_config = RESPONSE_CONFIG
     access_token: str
     token_type: str
 
@@ -65,32 +63,34 @@ class TokenData(BaseModel):
 
 class ForgotPasswordRequest(BaseModel):
     """Request schema for initiating password reset."""
-    email: EmailStr
+    email: NormalizedEmail
 
 class ResetPasswordRequest(BaseModel):
     """Request schema for setting a new password."""
-    email: EmailStr
+    email: NormalizedEmail
     new_password: str = Field(..., min_length=8)
 
-    @field_validator('new_password')
-    @classmethod
-    def validate_password_bcrypt(cls, v: str) -> str:
-        """Validate new password byte length for bcrypt compatibility."""
-        byte_length = len(v.encode('utf-8'))
-        if byte_length > 72:
-            raise ValueError(f'Password exceeds maximum 72 bytes ({byte_length} bytes found).')
-        return v
-
 class SimpleResponse(BaseModel):
     """Generic success message response."""
+    model_config = RESPONSE_CONFIG
     message: str
 
 class ForgotPasswordResponse(BaseModel):
     """Response schema for the simplified forgot password flow."""
+    model_config = RESPONSE_CONFIG
     message: str
 
 # --- Google Drive Schemas ---
 
+class DriveSyncStatus(BaseModel):
+    """Status of the user's latest background Drive sync."""
+    model_config = RESPONSE_CONFIG
+    status: str # "idle", "queued", "running", "success", "skipped" or "failed"
+    message: Optional[str] = None
+    processed_count: Optional[int] = None
+    unchanged_count: Optional[int] = None # Files skipped because their Drive version was already ingested
+    failed_files: list[str] = []
+
 class SetFolderRequest(BaseModel):
     """Request schema for setting the Google Drive Folder ID."""
     folder_id: str
\ No newline at end of file
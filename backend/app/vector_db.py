@@ -1,25 +1,40 @@
+import logging
+import threading
 import chromadb
 from app.core.config import settings
 import os
 
+logger = logging.getLogger(__name__)
+
 os.makedirs(settings.VECTOR_STORE_DIR, exist_ok=True) 
 
 client = chromadb.PersistentClient(path=settings.VECTOR_STORE_DIR)
-COLLECTION_NAME = "user_documents"
-
-# Get or Create Collection 
-collection = client.get_or_create_collection(
-    name=COLLECTION_NAME
-)
+# Each user gets their own collection, so retrieval is a plain ANN search with no
+# metadata `where` filter (Chroma has no metadata index; filtered search scans).
+COLLECTION_NAME_PREFIX = "kb_user_"
 
-print(f"ChromaDB client initialized. Collection '{COLLECTION_NAME}' object created.")
+logger.info("ChromaDB client initialized.")
 
 def get_chroma_client():
     return client
 
-def get_chroma_collection_name():
-    return COLLECTION_NAME
+def get_chroma_collection_name(user_id: int):
+    return f"{COLLECTION_NAME_PREFIX}{user_id}"
+
+# user_id -> Collection handle. get_or_create_collection reads (and may write) Chroma's
+# sqlite metadata on every call; the handle itself stays valid for the life of the client,
+# so it is resolved once per user. Collections are never deleted by the app.
+_collection_cache = {}
+_collection_cache_lock = threading.Lock()
 
-def get_chroma_collection_object():
-    """Returns the initialized low-level ChromaDB collection object."""
-    return client.get_or_create_collection(name=COLLECTION_NAME)
+def get_chroma_collection_object(user_id: int):
+    """Returns the low-level ChromaDB collection holding this user's document chunks."""
+    collection = _collection_cache.get(user_id)
+    if collection is not None:
+        return collection
+    with _collection_cache_lock:
+        collection = _collection_cache.get(user_id)
+        if collection is None:
+            collection = client.get_or_create_collection(name=get_chroma_collection_name(user_id))
+            _collection_cache[user_id] = collection
+        return collection
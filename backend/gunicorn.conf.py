@@ -0,0 +1,42 @@
+# backend/gunicorn.conf.py
+# Production launcher (run from backend/): gunicorn -c gunicorn.conf.py app.main:app
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Uvicorn workers pick uvloop + httptools automatically when installed
+worker_class = "uvicorn.workers.UvicornWorker"
+# One worker by default. Each worker opens its own embedded Chroma PersistentClient on the
+# same directory, and Chroma does not support multi-process access (HNSW indexes go stale
+# or corrupt; one worker's uploads are invisible to another's queries). The in-process
+# caches (semantic answers, Q&A chains, Drive clients, sync job state, the token cache)
+# are also per worker and would miss each other's invalidations. Each worker would start
+# its own cpu_count()-sized parse pool, too.
+#
+# Scaling out needs a Chroma server (chromadb.HttpClient) and shared caches/job state
+# first; only then raise WEB_CONCURRENCY. Within one worker, CPU-heavy parsing already
+# runs in the parse process pool and blocking endpoints in the threadpool.
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+worker_connections = 1000
+
+# Not preloading: the ChromaDB client (SQLite) and the SQLAlchemy pool are opened at
+# import time and must not be shared across forked workers.
+preload_app = False
+
+def on_starting(server):
+    """
+    Runs once in the master before any worker starts. With AUTO_MIGRATE enabled, tables
+    are created here, a single time, and workers are told to skip it: concurrent
+    CREATE TABLE from several workers on a fresh database fails with duplicate-key errors.
+    """
+    from app.core.config import settings
+    if not settings.AUTO_MIGRATE:
+        return
+    from app.database import Base, engine
+    import app.models # noqa: F401  (registers the tables on Base.metadata)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose() # Drop the master's connections so forked workers never share one
+    # Workers are forked from this process and inherit the already-imported settings
+    # object (and the environment, for any fresh import), so switch it off in both
+    settings.AUTO_MIGRATE = False
+    os.environ["AUTO_MIGRATE"] = "false"
@@ -1,9 +1,15 @@
+import os
+
 import uvicorn
 
 if __name__ == "__main__":
+    # Local development: create missing tables at startup (see Settings.AUTO_MIGRATE)
+    os.environ.setdefault("AUTO_MIGRATE", "true")
     uvicorn.run(
         "app.main:app",  
         host="127.0.0.1",
         port=8000,
+        loop="uvloop",   # libuv-based event loop (installed with uvicorn[standard])
+        http="httptools", # C HTTP parser
         reload=True      # Enable auto-reloading
     )
\ No newline at end of file
@@ -0,0 +1,17 @@
+// src/components/ChatMessage.jsx
+import React, { memo } from 'react';
+
+// A single chat bubble. Memoized so typing in the chat input (which re-renders ChatPage)
+// does not re-split and re-render every message in the history - only new messages render.
+function ChatMessage({ role, content }) {
+  return (
+    <div className={`message message-${role}`}>
+      {/* Render message content, splitting by newline */}
+      {content.split('\n').map((line, i) => (
+        <p key={i} style={{ marginBlockStart: '0em', marginBlockEnd: '0em' }}>{line || '\u00A0'}</p> // Use non-breaking space for empty lines
+      ))}
+    </div>
+  );
+}
+
+export default memo(ChatMessage);
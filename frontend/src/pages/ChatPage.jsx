@@ -3,14 +3,27 @@ import React, { useState, useEffect, useRef } from 'react';
 import LogoutButton from '../components/LogoutButton.jsx'; // Adjust extension if needed
 import FileUpload from '../components/FileUpload.jsx';   // Adjust extension if needed
 import DocumentList from '../components/DocumentList.jsx'; // Adjust extension if needed
+import ChatMessage from '../components/ChatMessage.jsx';
 import apiClient from '../api/apiClient.js'; // Adjust extension if needed
 import toast from 'react-hot-toast';
 
+// Builds a chat history entry with a stable id, used as the React key so existing
+// messages are never re-rendered when new ones are appended. The id only has to be unique
+// within the list; a counter also works outside secure contexts, where crypto.randomUUID is missing
+let nextMessageId = 0;
+const createMessage = (role, content) => ({ id: nextMessageId++, role, content });
+
+// How often to check on a background Drive sync
+const SYNC_POLL_INTERVAL_MS = 2000;
+// When to give up polling: matches DRIVE_SYNC_STALE_SECONDS on the backend, after which a job
+// still marked running is considered dead
+const SYNC_POLL_TIMEOUT_MS = 60 * 60 * 1000;
+
 function ChatPage() {
   // --- State ---
-  // messages: Array to hold the chat history objects ({ role: 'user'/'assistant', content: '...' })
-  const [messages, setMessages] = useState([
-    { role: 'assistant', content: 'Hello! Upload a document or ask a question about your existing documents.' }
+  // messages: Array to hold the chat history objects ({ id, role: 'user'/'assistant', content: '...' })
+  const [messages, setMessages] = useState(() => [
+    createMessage('assistant', 'Hello! Upload a document or ask a question about your existing documents.')
   ]);
   // inputValue: Tracks the text currently typed in the chat input field
   const [inputValue, setInputValue] = useState('');
@@ -28,6 +41,8 @@ function ChatPage() {
   const messagesEndRef = useRef(null);
   // documentListRef: Ref to the DocumentList component to call its 'refresh' method externally
   const documentListRef = useRef(null);
+  // isMountedRef: Cleared on unmount (e.g. logout) so a running sync poll stops
+  const isMountedRef = useRef(true);
 
   // --- Effects ---
   // Scrolls the chat window to the bottom whenever the 'messages' array updates
@@ -35,6 +50,12 @@ function ChatPage() {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages]); // Dependency array ensures this runs only when messages change
 
+  // Tracks whether the page is still mounted, for the Drive sync poll loop
+  useEffect(() => {
+    isMountedRef.current = true;
+    return () => { isMountedRef.current = false; };
+  }, []);
+
   // --- Handlers ---
   // Function triggered when the user sends a message
   const handleSendMessage = async () => {
@@ -42,7 +63,7 @@ function ChatPage() {
     if (!inputValue.trim() || isLoading) return;
 
     // Optimistic UI update: Add user's message immediately
-    const userMessage = { role: 'user', content: inputValue };
+    const userMessage = createMessage('user', inputValue);
     setMessages((prevMessages) => [...prevMessages, userMessage]);
 
     // Clear input and set loading state
@@ -55,15 +76,15 @@ function ChatPage() {
         query: userMessage.content, // Send only the query text
       });
       // Add the assistant's response to the chat
-      const assistantMessage = { role: 'assistant', content: response.data.answer };
+      const assistantMessage = createMessage('assistant', response.data.answer);
       setMessages((prevMessages) => [...prevMessages, assistantMessage]);
     } catch (err) {
       console.error("Error querying document:", err);
       // Add a user-friendly error message to the chat on failure
-      const errorMessage = {
-        role: 'assistant',
-        content: 'Sorry, I encountered an error processing your request. Please try again.'
-      };
+      const errorMessage = createMessage(
+        'assistant',
+        'Sorry, I encountered an error processing your request. Please try again.'
+      );
       setMessages((prevMessages) => [...prevMessages, errorMessage]);
     } finally {
       // Ensure loading state is always turned off after the API call finishes
@@ -75,7 +96,7 @@ function ChatPage() {
   const handleUploadSuccess = (fileName) => {
     // Add a confirmation message to the chat history
     setMessages((prevMessages) => [...prevMessages,
-        { role: 'assistant', content: `"${fileName}" processed and added to your knowledge base.` }
+        createMessage('assistant', `"${fileName}" processed and added to your knowledge base.`)
     ]);
     // Call the 'refresh' method on the DocumentList component via its ref
     if (documentListRef.current) {
@@ -111,11 +132,34 @@ function ChatPage() {
     const syncToastId = toast.loading("Starting Google Drive sync..."); // Show initial loading toast
 
     try {
-      // Call the backend sync endpoint
-      const response = await apiClient.post('/api/rag/drive/sync');
+      // Queue the sync; the backend runs it in the background
+      await apiClient.post('/api/rag/drive/sync');
+      toast.loading("Google Drive sync in progress...", { id: syncToastId });
 
-      // Update toast with success message from backend
-      toast.success(response.data.message || "Sync process finished.", { id: syncToastId });
+      // Poll until the background sync finishes, the page unmounts, or the deadline passes
+      const deadline = Date.now() + SYNC_POLL_TIMEOUT_MS;
+      let job;
+      do {
+        await new Promise((resolve) => setTimeout(resolve, SYNC_POLL_INTERVAL_MS));
+        if (!isMountedRef.current) {
+          toast.dismiss(syncToastId);
+          return;
+        }
+        job = (await apiClient.get('/api/rag/drive/sync/status')).data;
+      } while ((job.status === 'queued' || job.status === 'running') && Date.now() < deadline);
+
+      if (job.status === 'queued' || job.status === 'running') {
+        // Still not finished after the stale window: the job was most likely lost
+        toast.error("The Google Drive sync did not report an outcome. Check your documents and try again.", { id: syncToastId });
+      } else if (job.status === 'failed') {
+        toast.error(job.message || "Google Drive sync failed.", { id: syncToastId });
+      } else if (job.status === 'idle') {
+        // No job on record right after queueing one: the outcome is unknown, not a success
+        toast.error("Could not get the Google Drive sync status. Check your documents shortly.", { id: syncToastId });
+      } else {
+        // Update toast with success message from backend
+        toast.success(job.message || "Sync process finished.", { id: syncToastId });
+      }
 
       // Refresh the document list after sync completes
       if (documentListRef.current) {
@@ -175,13 +219,8 @@ function ChatPage() {
            {/* Added safety check before mapping messages */}
            <div className={`message-list ${isLoading ? 'loading' : ''}`}>
             {/* Check if messages is an array before mapping */}
-            {Array.isArray(messages) && messages.map((msg, index) => (
-              <div key={index} className={`message message-${msg.role}`}>
-                {/* Render message content, splitting by newline */}
-                {msg.content.split('\n').map((line, i) => (
-                  <p key={i} style={{ marginBlockStart: '0em', marginBlockEnd: '0em' }}>{line || '\u00A0'}</p> // Use non-breaking space for empty lines
-                ))}
-              </div>
+            {Array.isArray(messages) && messages.map((msg) => (
+              <ChatMessage key={msg.id} role={msg.role} content={msg.content} />
             ))}
              {/* Show loading indicator when isLoading is true */}
              {isLoading && (